@@ -0,0 +1,77 @@
+# File: backends.py
+# Description: Compares the dancing links (dlx) and SAT (sat) backends with
+#   the searches of search.py on the instances in tests/, reporting for each
+#   family the nodes expanded (the options chosen, for dlx, which include the
+#   water of each cell, and the conflicts, for sat), the time taken and the
+#   longest time taken by an instance. The boards found are checked against
+#   the rules, since the backends may find another solution of instances
+#   with more than one.
+# Usage: python3 bench/backends.py [--families T easy medium hard]
+#   [--searches dfs dlx sat]
+
+import glob
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from branching import is_solution, tests_dir
+from search_core import InstrumentedProblem
+
+
+def count_choices(puzzle):
+    """Returns the number of options chosen by dlx to solve the puzzle."""
+    links, _ = bimaru.get_exact_cover(bimaru.Board.from_puzzle(puzzle))
+    next(links.solve(), None)
+    return links.nodes
+
+
+def count_conflicts(puzzle):
+    """Returns the number of conflicts sat runs into to solve the puzzle."""
+    solver, _ = bimaru.get_cnf(bimaru.Board.from_puzzle(puzzle))
+    solver.solve()
+    return solver.conflicts
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares the solving backends.")
+    parser.add_argument(
+        "--families",
+        nargs="+",
+        default=["T", "easy", "medium", "hard", "impossible", "fleet"],
+    )
+    parser.add_argument(
+        "--searches", nargs="+", choices=bimaru.searchers, default=["dfs", "dlx", "sat"]
+    )
+    args = parser.parse_args()
+
+    print(f"{'family':10s} {'search':12s} {'nodes':>8s} {'time':>8s} {'longest':>8s}")
+    for family in args.families:
+        paths = sorted(glob.glob(os.path.join(tests_dir, family + "*.txt")))
+        for search in args.searches:
+            nodes = elapsed = longest = 0
+            for path in paths:
+                with open(path) as file:
+                    puzzle = bimaru.Puzzle.parse(file)
+                start = time.perf_counter()
+                board = bimaru.Board.from_puzzle(puzzle)
+                problem = InstrumentedProblem(bimaru.Bimaru(board))
+                goal_node = bimaru.searchers[search](problem)
+                solve_time = time.perf_counter() - start
+                elapsed += solve_time
+                longest = max(longest, solve_time)
+                if search == "dlx":
+                    nodes += count_choices(puzzle)
+                elif search == "sat":
+                    nodes += count_conflicts(puzzle)
+                else:
+                    nodes += problem.succs
+                if goal_node is None or not is_solution(puzzle, goal_node.state.board):
+                    sys.exit(f"{search} didn't solve {os.path.basename(path)}")
+            print(
+                f"{family:10s} {search:12s} {nodes:8d} {elapsed:7.3f}s "
+                f"{longest:7.3f}s"
+            )
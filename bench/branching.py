@@ -0,0 +1,135 @@
+# File: branching.py
+# Description: Compares the branching policies and the orderings of the
+#   placements of the solver on the instances in tests/, reporting for each
+#   family the nodes expanded, the time taken and the longest time taken by
+#   an instance with each combination. Since some instances have more than
+#   one solution, the boards found are checked against the rules instead of
+#   the expected ones.
+# Usage: python3 bench/branching.py [--families easy medium hard]
+#   [--branchings largest mrv] [--orderings scan lcv known saturate]
+#   [--search lazy]
+
+import glob
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from search_core import InstrumentedProblem
+
+tests_dir = os.path.join(os.path.dirname(__file__), "..", "tests")
+
+
+def is_solution(puzzle, board):
+    """Checks if the board solves the puzzle: the counts of every row and
+    column, the hints and the fleet are respected and no two boats touch."""
+    grid = str(board).lower().replace("w", ".").split("\n")
+    size = puzzle.size
+    if any(val not in ".tblrcm" for line in grid for val in line):
+        return False
+    for row, col, val in puzzle.hints:
+        if grid[row][col] != val.lower().replace("w", "."):
+            return False
+    rows = tuple(sum(val != "." for val in line) for line in grid)
+    cols = tuple(sum(line[col] != "." for line in grid) for col in range(size))
+    if rows != puzzle.rows_fixed_num or cols != puzzle.cols_fixed_num:
+        return False
+
+    fleet, covered = [0] * len(puzzle.fleet), set()
+    for row in range(size):
+        for col in range(size):
+            if grid[row][col] not in "tlc":
+                continue
+            cells = get_boat_cells(grid, row, col)
+            if cells is None:
+                return False
+            if len(cells) >= len(fleet):
+                return False
+            fleet[len(cells)] += 1
+            covered.update(cells)
+            # Every cell around the boat must be water
+            for r, c in cells:
+                for d_row in (-1, 0, 1):
+                    for d_col in (-1, 0, 1):
+                        neighbour = (r + d_row, c + d_col)
+                        if neighbour not in cells and get_cell(grid, *neighbour) != ".":
+                            return False
+    boat_pieces = sum(val != "." for line in grid for val in line)
+    return boat_pieces == len(covered) and tuple(fleet) == puzzle.fleet
+
+
+def get_boat_cells(grid, row: int, col: int):
+    """Returns the cells of the boat whose top or left extreme (or submarine)
+    is at the given position, or None if the boat isn't closed."""
+    val = grid[row][col]
+    if val == "c":
+        return [(row, col)]
+    d_row, d_col = (1, 0) if val == "t" else (0, 1)
+    cells = [(row, col)]
+    while get_cell(grid, row + d_row, col + d_col) == "m":
+        row, col = row + d_row, col + d_col
+        cells.append((row, col))
+    row, col = row + d_row, col + d_col
+    if get_cell(grid, row, col) != ("b" if val == "t" else "r"):
+        return None
+    cells.append((row, col))
+    return cells
+
+
+def get_cell(grid, row: int, col: int):
+    """Returns the value of a cell of the grid, water outside of it."""
+    if 0 <= row < len(grid) and 0 <= col < len(grid):
+        return grid[row][col]
+    return "."
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares the branching policies.")
+    parser.add_argument("--families", nargs="+", default=["easy", "medium", "hard"])
+    parser.add_argument(
+        "--branchings", nargs="+", choices=bimaru.branchings, default=["largest", "mrv"]
+    )
+    parser.add_argument(
+        "--orderings",
+        nargs="+",
+        choices=bimaru.orderings,
+        default=list(bimaru.orderings),
+    )
+    parser.add_argument("--search", choices=bimaru.searchers, default="lazy")
+    args = parser.parse_args()
+
+    print(
+        f"{'family':10s} {'policy':8s} {'ordering':8s} {'nodes':>8s} {'time':>8s} "
+        f"{'longest':>8s}"
+    )
+    for family in args.families:
+        paths = sorted(glob.glob(os.path.join(tests_dir, family + "*.txt")))
+        for branching in args.branchings:
+            for ordering in args.orderings:
+                nodes = elapsed = longest = 0
+                for path in paths:
+                    with open(path) as file:
+                        puzzle = bimaru.Puzzle.parse(file)
+                    start = time.perf_counter()
+                    board = bimaru.Board.from_puzzle(puzzle)
+                    symmetry = args.search != "backjumping"
+                    problem = InstrumentedProblem(
+                        bimaru.Bimaru(board, branching, ordering, symmetry)
+                    )
+                    goal_node = bimaru.searchers[args.search](problem)
+                    solve_time = time.perf_counter() - start
+                    elapsed += solve_time
+                    longest = max(longest, solve_time)
+                    nodes += problem.succs
+                    if goal_node is None or not is_solution(
+                        puzzle, goal_node.state.board
+                    ):
+                        name = os.path.basename(path)
+                        sys.exit(f"{branching}/{ordering} didn't solve {name}")
+                print(
+                    f"{family:10s} {branching:8s} {ordering:8s} {nodes:8d} "
+                    f"{elapsed:7.3f}s {longest:7.3f}s"
+                )
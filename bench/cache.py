@@ -0,0 +1,85 @@
+# File: cache.py
+# Description: Compares solving the instances in tests/ with looking them up
+#   in the solution cache, after it was filled with their solutions, as
+#   rotated or reflected copies of them (a random symmetry for each one).
+#   Reports the mean, 95th percentile and longest time taken by an instance
+#   with each one and the hits of the cache. The boards it gives back are
+#   checked against the rules.
+# Usage: python3 bench/cache.py [--families T easy medium hard] [--seed S]
+
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from branching import is_solution, tests_dir
+from portfolio import summarize
+
+
+def transform_puzzle(puzzle, symmetry):
+    """Returns the puzzle that the symmetry turns the given one into."""
+    transpose, flip_rows, flip_cols = symmetry
+    rows, cols = puzzle.rows_fixed_num, puzzle.cols_fixed_num
+    if transpose:
+        rows, cols = cols, rows
+    hints = [
+        bimaru.transform_cell(puzzle.size, symmetry, row, col)
+        + (bimaru.transform_value(symmetry, val),)
+        for row, col, val in puzzle.hints
+    ]
+    return bimaru.Puzzle(
+        rows[::-1] if flip_rows else rows,
+        cols[::-1] if flip_cols else cols,
+        hints,
+        puzzle.fleet,
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares the solution cache with solving.")
+    parser.add_argument(
+        "--families",
+        nargs="*",
+        default=["T", "easy", "medium", "hard", "impossible", "fleet"],
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    puzzles = []
+    for family in args.families:
+        for path in sorted(glob.glob(os.path.join(tests_dir, family + "*.txt"))):
+            with open(path) as file:
+                puzzles.append(bimaru.Puzzle.parse(file))
+
+    rng = random.Random(args.seed)
+    cache = bimaru.SolutionCache(os.path.join(tempfile.mkdtemp(), "cache.db"))
+    solving, lookups = [], []
+    for puzzle in puzzles:
+        start = time.perf_counter()
+        goal_node = bimaru.searchers["lazy"](
+            bimaru.Bimaru(bimaru.Board.from_puzzle(puzzle))
+        )
+        solving.append(time.perf_counter() - start)
+        cache.put(puzzle, repr(goal_node.state.board))
+    for puzzle in puzzles:
+        copy = transform_puzzle(puzzle, rng.choice(bimaru.symmetries))
+        start = time.perf_counter()
+        solution = cache.get(copy)
+        lookups.append(time.perf_counter() - start)
+        if solution is None or not is_solution(copy, solution):
+            sys.exit("the cache didn't solve a copy of a puzzle")
+
+    print(f"{len(puzzles)} puzzles, {cache}")
+    print(f"{'mode':10s} {'mean':>9s} {'p95':>9s} {'longest':>9s}")
+    for mode, times in (("solve", solving), ("cache", lookups)):
+        mean, p95, longest = summarize(times)
+        print(
+            f"{mode:10s} {1000 * mean:7.3f}ms {1000 * p95:7.3f}ms "
+            f"{1000 * longest:7.3f}ms"
+        )
@@ -0,0 +1,367 @@
+# File: corpus.py
+# Description: Benchmarks the solver on the instance families in tests/
+#   (T, easy, medium, hard, impossible, instance and fleet), with one or
+#   more strategies, as a matrix like compare_searchers in search.py. For
+#   each strategy and family, it records the wall and CPU time and the nodes
+#   expanded and generated (from InstrumentedProblem) of every instance, the
+#   50th, 95th and 99th percentiles of the wall time and the peak RSS of the
+#   process solving the family (a fresh one for each family and run). The
+#   results can be compared with the ones of another checkout, run in the
+#   same session and taking turns with this one (see --against), or saved
+#   as a JSON baseline and compared with another one, flagging the
+#   regressions: times significantly longer (Wilcoxon signed-rank test over
+#   the instances, paired, a minimum change and every run slower than every
+#   old one), more nodes generated, a larger peak RSS or fewer instances
+#   solved. Exits with an error if there are any.
+# Usage: python3 bench/corpus.py [--families T easy medium hard]
+#   [--strategies lazy dfs backjumping] [--repeat N] [--timeout SECONDS]
+#   [--src DIR] [--output FILE] [--against DIR | --compare BASELINE [RESULTS]]
+
+import glob
+import json
+import math
+import os
+import re
+import resource
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from argparse import SUPPRESS, ArgumentParser
+
+src_dir = os.path.join(os.path.dirname(__file__), "..", "src")
+tests_dir = os.path.join(os.path.dirname(__file__), "..", "tests")
+
+
+def raise_timeout(signum, frame):
+    raise TimeoutError
+
+
+def run_family(src: str, strategy: str, paths, timeout: float):
+    """Solves the instances in this process, with the solver in the given
+    source directory, and returns a record of each one, by name, and the
+    peak RSS of the process, in KiB. Instances taking longer than the
+    timeout are stopped."""
+    sys.path.insert(0, src)
+    import bimaru
+    from search_core import InstrumentedProblem
+
+    # Imported after the solver, so its own import of it gets the same one
+    from branching import is_solution
+
+    search, branching, ordering = bimaru.parse_strategy(strategy)
+    signal.signal(signal.SIGALRM, raise_timeout)
+    records = {}
+    for path in paths:
+        with open(path) as file:
+            puzzle = bimaru.Puzzle.parse(file)
+        problem = None
+        wall, cpu = time.perf_counter(), time.process_time()
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            board = bimaru.Board.from_puzzle(puzzle)
+            problem = InstrumentedProblem(
+                bimaru.Bimaru(board, branching, ordering, search != "backjumping")
+            )
+            goal_node = bimaru.searchers[search](problem)
+            if goal_node is None:
+                status = "unsolved"
+            elif is_solution(puzzle, goal_node.state.board):
+                status = "solved"
+            else:
+                status = "wrong"
+        except TimeoutError:
+            status = "timeout"
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        # The nodes of a search stopped halfway don't say much
+        counted = status != "timeout" and problem is not None
+        records[os.path.basename(path)] = {
+            "status": status,
+            "wall": time.perf_counter() - wall,
+            "cpu": time.process_time() - cpu,
+            "expanded": problem.succs if counted else None,
+            "generated": problem.states if counted else None,
+        }
+    return records, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def is_rejected(path: str):
+    """Checks if the instance is meant to be rejected by the solver, i.e.,
+    if its .out file is empty."""
+    expected = os.path.splitext(path)[0] + ".out"
+    return os.path.exists(expected) and os.path.getsize(expected) == 0
+
+
+def find_families(families):
+    """Returns the paths of the instances of each family, by family, in the
+    given order (every family in tests/ with none given). The instances
+    meant to be rejected have nothing to solve and are left out."""
+    found = {}
+    for path in sorted(glob.glob(os.path.join(tests_dir, "*.txt"))):
+        if is_rejected(path):
+            continue
+        family = re.match(r"[A-Za-z]*", os.path.basename(path)).group()
+        found.setdefault(family, []).append(path)
+    if not families:
+        return found
+    return {family: found.get(family, []) for family in families}
+
+
+def percentile(times, fraction: float):
+    """Returns the given percentile (as a fraction) of the times."""
+    times = sorted(times)
+    return times[int(fraction * (len(times) - 1))]
+
+
+def run_worker(src: str, strategy: str, family: str, paths, timeout: float):
+    """Solves the instances of a family in a fresh process, with the solver
+    in the given source directory, and returns what run_family returns."""
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", strategy, "--src", src]
+        + ["--timeout", str(timeout)]
+        + paths,
+        capture_output=True,
+        text=True,
+    )
+    if output.returncode != 0:
+        sys.exit(f"{strategy} failed on {family}:\n{output.stderr}")
+    return json.loads(output.stdout)
+
+
+def summarize(runs, peak_rss: int):
+    """Returns the results of a strategy on a family from the records of its
+    runs. The record of an instance has the median of its wall and CPU times
+    over the runs, and the total wall time of each run is kept, to tell
+    how much it varies between runs."""
+    instances = {}
+    for name, record in runs[0].items():
+        instances[name] = dict(record)
+        for key in ("wall", "cpu"):
+            instances[name][key] = statistics.median(run[name][key] for run in runs)
+    walls = [record["wall"] for record in instances.values()]
+    return {
+        "instances": instances,
+        "solved": sum(r["status"] == "solved" for r in instances.values()),
+        "timeouts": sum(r["status"] == "timeout" for r in instances.values()),
+        "wall": sum(walls),
+        "runs": [sum(record["wall"] for record in run.values()) for run in runs],
+        "cpu": sum(record["cpu"] for record in instances.values()),
+        "expanded": sum(r["expanded"] or 0 for r in instances.values()),
+        "generated": sum(r["generated"] or 0 for r in instances.values()),
+        "p50": percentile(walls, 0.5),
+        "p95": percentile(walls, 0.95),
+        "p99": percentile(walls, 0.99),
+        "peak_rss_kib": peak_rss,
+    }
+
+
+def run_matrix(srcs, strategies, families, repeat: int, timeout: float):
+    """Runs every strategy on every family, repeat times, each in a fresh
+    process, with the solver in each of the source directories, and returns
+    the results of each one, by strategy and family. The runs of the
+    sources are interleaved, taking turns to go first, so that they share
+    whatever the machine is doing meanwhile and their times can be
+    compared."""
+    results = [{} for _ in srcs]
+    for strategy in strategies:
+        for result in results:
+            result[strategy] = {}
+        for family, paths in families.items():
+            if not paths:
+                continue
+            runs, peak_rss = [[] for _ in srcs], [0] * len(srcs)
+            for turn in range(repeat):
+                order = list(range(len(srcs)))
+                for k in order[turn % len(srcs) :] + order[: turn % len(srcs)]:
+                    records, rss = run_worker(srcs[k], strategy, family, paths, timeout)
+                    runs[k].append(records)
+                    peak_rss[k] = max(peak_rss[k], rss)
+            for k, result in enumerate(results):
+                result[strategy][family] = summarize(runs[k], peak_rss[k])
+    return results
+
+
+def signed_rank_test(diffs):
+    """Returns the two-sided p-value of the Wilcoxon signed-rank test of the
+    paired differences (with the normal approximation, ties getting the mean
+    of their ranks and zeros left out), i.e., how likely differences at
+    least as one-sided are if both samples come from the same distribution."""
+    diffs = sorted((d for d in diffs if d != 0), key=abs)
+    n = len(diffs)
+    if n == 0:
+        return 1.0
+    ranks, i = [0.0] * n, 0
+    while i < n:
+        j = i
+        while j + 1 < n and abs(diffs[j + 1]) == abs(diffs[i]):
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        i = j + 1
+    positive = sum(rank for rank, d in zip(ranks, diffs) if d > 0)
+    mean = n * (n + 1) / 4
+    deviation = math.sqrt(n * (n + 1) * (2 * n + 1) / 24)
+    z = (positive - mean) / deviation
+    return 2 * (1 - statistics.NormalDist().cdf(abs(z)))
+
+
+def compare(old, new, alpha: float, threshold: float):
+    """Prints the changes from the old results to the new ones, for every
+    strategy and family in both, and returns the regressions found. The
+    time ratio is the geometric mean of the ratios of the wall times of the
+    instances solved in both. A family is only slower (or faster) if,
+    besides the test and the threshold, every run of it took longer (or
+    less) than every old one, so the noise between runs isn't taken for a
+    change."""
+    regressions = []
+    print(
+        f"{'strategy':20s} {'family':10s} {'time':>7s} {'p-value':>8s} "
+        f"{'generated':>10s} {'peak RSS':>9s} {'solved':>9s}  verdict"
+    )
+    for strategy, families in new["results"].items():
+        for family, after in families.items():
+            before = old["results"].get(strategy, {}).get(family)
+            if before is None:
+                continue
+            common = [
+                name
+                for name, record in after["instances"].items()
+                if record["status"] == "solved"
+                and before["instances"].get(name, {}).get("status") == "solved"
+            ]
+            logs = [
+                math.log(
+                    max(after["instances"][name]["wall"], 1e-9)
+                    / max(before["instances"][name]["wall"], 1e-9)
+                )
+                for name in common
+            ]
+            ratio = math.exp(statistics.fmean(logs)) if logs else 1.0
+            p_value = signed_rank_test(logs)
+            generated = (after["generated"] + 1) / (before["generated"] + 1)
+            rss = after["peak_rss_kib"] / max(before["peak_rss_kib"], 1)
+            # Results saved before the runs were kept have nothing to go by
+            slower = min(after.get("runs", [math.inf])) > max(before.get("runs", [0]))
+            faster = max(after.get("runs", [0])) < min(before.get("runs", [math.inf]))
+            found = []
+            if p_value < alpha and ratio > 1 + threshold and slower:
+                found.append("slower")
+            if after["generated"] > before["generated"]:
+                found.append("more nodes")
+            if rss > 1 + threshold:
+                found.append("more memory")
+            if after["solved"] < before["solved"]:
+                found.append("fewer solved")
+            if p_value < alpha and ratio < 1 - threshold and faster:
+                verdict = ", ".join(found) or "faster"
+            else:
+                verdict = ", ".join(found) or "ok"
+            regressions += [(strategy, family, what) for what in found]
+            print(
+                f"{strategy:20s} {family:10s} {ratio:6.2f}x {p_value:8.4f} "
+                f"{generated:9.2f}x {rss:8.2f}x "
+                f"{before['solved']:4d}>{after['solved']:<4d}  {verdict}"
+            )
+    return regressions
+
+
+def print_matrix(results):
+    """Prints the results of every strategy on every family."""
+    print(
+        f"{'strategy':20s} {'family':10s} {'solved':>8s} {'wall':>8s} "
+        f"{'cpu':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'generated':>10s} "
+        f"{'peak RSS':>9s}"
+    )
+    for strategy, families in results.items():
+        for family, result in families.items():
+            solved = f"{result['solved']}/{len(result['instances'])}"
+            print(
+                f"{strategy:20s} {family:10s} {solved:>8s} {result['wall']:7.3f}s "
+                f"{result['cpu']:7.3f}s {1000 * result['p50']:6.1f}ms "
+                f"{1000 * result['p95']:6.1f}ms {1000 * result['p99']:6.1f}ms "
+                f"{result['generated']:10d} {result['peak_rss_kib'] / 1024:7.1f}M"
+            )
+
+
+def get_commit(src: str):
+    """Returns the commit checked out in the source directory, if any."""
+    output = subprocess.run(
+        ["git", "-C", src, "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+    )
+    return output.stdout.strip() or None
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmarks the solver on the corpus.")
+    parser.add_argument("--families", nargs="*", default=[])
+    parser.add_argument("--strategies", nargs="+", default=["lazy"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--src", default=src_dir, help="source of the solver")
+    parser.add_argument("--output", metavar="FILE", help="save the results")
+    parser.add_argument(
+        "--compare",
+        nargs="+",
+        metavar="FILE",
+        help="compare the results in the second file (or, without it, the "
+        "ones of this run) with the baseline in the first one",
+    )
+    parser.add_argument(
+        "--against",
+        metavar="DIR",
+        help="compare the results with the ones of the solver in DIR, run in "
+        "the same session, taking turns with the one in --src",
+    )
+    parser.add_argument("--alpha", type=float, default=0.01)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--worker", metavar="STRATEGY", help=SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_family(args.src, args.worker, args.paths, args.timeout)))
+        sys.exit()
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline and, optionally, the results")
+    if args.compare and args.against:
+        parser.error("--compare can't be used with --against")
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1]) as file:
+            new = json.load(file)
+    else:
+        families = find_families(args.families)
+        srcs = [os.path.abspath(args.src)]
+        if args.against:
+            srcs.append(os.path.abspath(args.against))
+        results = run_matrix(srcs, args.strategies, families, args.repeat, args.timeout)
+        saved = [
+            {
+                "commit": get_commit(src),
+                "python": sys.version.split()[0],
+                "repeat": args.repeat,
+                "timeout": args.timeout,
+                "results": result,
+            }
+            for src, result in zip(srcs, results)
+        ]
+        new = saved[0]
+        if args.against:
+            old = saved[1]
+        print_matrix(new["results"])
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(new, file, indent=1)
+
+    if args.compare:
+        with open(args.compare[0]) as file:
+            old = json.load(file)
+    if args.compare or args.against:
+        print(f"\n{old['commit']} -> {new['commit']}")
+        regressions = compare(old, new, args.alpha, args.threshold)
+        if regressions:
+            sys.exit(f"{len(regressions)} regressions")
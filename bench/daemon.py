@@ -0,0 +1,116 @@
+# File: daemon.py
+# Description: Compares the latency of solving the instances in tests/ by
+#   starting bimaru.py for each one with sending them to the solver daemon,
+#   one at a time (waiting for each response before sending the next
+#   request) and all at once on a single connection. Reports the mean, 95th
+#   percentile and longest latency of a request and the total time taken.
+#   The boards sent back are checked against the expected outputs.
+# Usage: python3 bench/daemon.py [--families T easy medium hard]
+#   [--jobs N] [--strategy lazy]
+
+import asyncio
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from branching import tests_dir
+from portfolio import summarize
+
+src_dir = os.path.join(os.path.dirname(__file__), "..", "src")
+
+
+def run_processes(instances, strategy: str):
+    """Solves each instance with a process of its own, returning the
+    latency of each one and the boards found."""
+    search, branching, ordering = bimaru.parse_strategy(strategy)
+    command = [sys.executable, os.path.join(src_dir, "bimaru.py"), "--search", search]
+    command += ["--branching", branching, "--ordering", ordering]
+    times, boards = [], []
+    for text in instances:
+        start = time.perf_counter()
+        result = subprocess.run(command, input=text, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        boards.append(result.stdout.strip())
+    return times, boards
+
+
+async def run_daemon(socket: str, instances, pipelined: bool):
+    """Sends the instances to the daemon on a single connection, either all
+    at once or each one after the response to the one before, returning the
+    latency of each one (from when it was sent) and the boards sent back."""
+    reader, writer = await asyncio.open_unix_connection(socket)
+    times, boards, sent = [], [], []
+    for text in instances:
+        sent.append(time.perf_counter())
+        writer.write(text.encode() + b"\n")
+        if not pipelined:
+            response = json.loads(await reader.readline())
+            times.append(time.perf_counter() - sent[-1])
+            boards.append(response.get("board"))
+    for start in sent[len(times) :]:
+        response = json.loads(await reader.readline())
+        times.append(time.perf_counter() - start)
+        boards.append(response.get("board"))
+    writer.close()
+    return times, boards
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares the daemon with one process each.")
+    parser.add_argument(
+        "--families",
+        nargs="*",
+        default=["T", "easy", "medium", "hard", "impossible", "fleet"],
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--strategy", default="lazy")
+    args = parser.parse_args()
+
+    paths = []
+    for family in args.families:
+        paths += sorted(glob.glob(os.path.join(tests_dir, family + "*.txt")))
+    instances, expected = [], []
+    for path in paths:
+        with open(path) as file:
+            instances.append(file.read())
+        with open(os.path.splitext(path)[0] + ".out") as file:
+            expected.append(file.read().strip())
+
+    socket = os.path.join(tempfile.mkdtemp(), "bimaru.sock")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(src_dir, "server.py"), "--socket", socket]
+        + ["--jobs", str(args.jobs), "--strategy", args.strategy]
+    )
+    try:
+        while not os.path.exists(socket):
+            time.sleep(0.05)
+        results = {}
+        for mode in ("processes", "daemon", "pipelined"):
+            start = time.perf_counter()
+            if mode == "processes":
+                times, boards = run_processes(instances, args.strategy)
+            else:
+                times, boards = asyncio.run(
+                    run_daemon(socket, instances, mode == "pipelined")
+                )
+            results[mode] = times, time.perf_counter() - start
+            wrong = sum(board != out for board, out in zip(boards, expected))
+            if wrong:
+                print(f"{mode}: {wrong} boards differ from the expected output")
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{len(instances)} instances")
+    print(f"{'mode':10s} {'mean':>8s} {'p95':>8s} {'longest':>8s} {'total':>8s}")
+    for mode, (times, total) in results.items():
+        mean, p95, longest = summarize(times)
+        print(f"{mode:10s} {mean:7.3f}s {p95:7.3f}s {longest:7.3f}s {total:7.2f}s")
@@ -0,0 +1,58 @@
+# File: memory.py
+# Description: Measures how many bytes each search node takes (the Node, its
+#   BimaruState and its Board), by expanding the root of every instance in
+#   tests/ (but the ones meant to be rejected) and tracing the memory
+#   retained by the children.
+# Usage: python3 bench/memory.py [pattern]
+
+import glob
+import os
+import re
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from corpus import is_rejected
+from search_core import Node
+
+tests_dir = os.path.join(os.path.dirname(__file__), "..", "tests")
+
+
+def measure(path: str):
+    """Returns the number of children of the root of the instance and the
+    bytes retained by them."""
+    with open(path) as file:
+        puzzle = bimaru.Puzzle.parse(file)
+    problem = bimaru.Bimaru(bimaru.Board.from_puzzle(puzzle))
+    root = Node(problem.initial)
+    actions = problem.actions(root.state)
+    root.expand(problem)  # warms up the caches, which shouldn't be counted
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    children = [root.child_node(problem, action) for action in actions]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(children), after - before
+
+
+if __name__ == "__main__":
+    pattern = sys.argv[1] if len(sys.argv) > 1 else "*"
+    paths = sorted(glob.glob(os.path.join(tests_dir, pattern + ".txt")))
+    paths = [path for path in paths if not is_rejected(path)]
+    measure(paths[0])  # the first measure also counts allocations made once
+    families = {}
+    for path in paths:
+        family = re.match(r"[A-Za-z]*", os.path.basename(path)).group()
+        nodes, size = measure(path)
+        total = families.setdefault(family, [0, 0])
+        total[0] += nodes
+        total[1] += size
+
+    for family, (nodes, size) in families.items():
+        if nodes:
+            print(f"{family:12s} {nodes:6d} nodes {size / nodes:8.1f} bytes/node")
+    nodes = sum(total[0] for total in families.values())
+    size = sum(total[1] for total in families.values())
+    print(f"{'all':12s} {nodes:6d} nodes {size / nodes:8.1f} bytes/node")
@@ -0,0 +1,95 @@
+# File: portfolio.py
+# Description: Compares the portfolio, which races several strategies in
+#   parallel processes, with each of its strategies on its own (in a process
+#   too, so all of them pay for starting one), on the instances in tests/
+#   and, optionally, on random puzzles of larger boards. Reports the mean,
+#   95th percentile and longest time taken by an instance with each one, the
+#   instances that timed out (counted as taking the timeout) and how many
+#   instances each strategy won in the portfolio. The boards found are
+#   checked against the rules, since strategies may find different solutions
+#   of instances with more than one.
+# Usage: python3 bench/portfolio.py [--families T easy medium hard]
+#   [--strategies lazy lazy:mrv dlx sat] [--sizes 20] [--puzzles N]
+#   [--timeout SECONDS]
+
+import glob
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from branching import is_solution, tests_dir
+from scaling import generate, get_fleet
+
+
+def race(puzzle, strategies, timeout: float):
+    """Solves the puzzle with the portfolio of the given strategies and
+    returns the time taken and the winner, None if it timed out. The boards
+    found are checked against the rules."""
+    start = time.perf_counter()
+    board, winner = bimaru.solve_portfolio(puzzle, strategies, timeout)
+    elapsed = time.perf_counter() - start
+    if winner is not None and (board is None or not is_solution(puzzle, board)):
+        sys.exit(f"{winner} didn't solve a puzzle")
+    return elapsed, winner
+
+
+def summarize(times):
+    """Returns the mean, 95th percentile and longest of the times."""
+    times = sorted(times)
+    return sum(times) / len(times), times[int(0.95 * (len(times) - 1))], times[-1]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares the portfolio with its parts.")
+    parser.add_argument(
+        "--families",
+        nargs="*",
+        default=["T", "easy", "medium", "hard", "impossible", "fleet"],
+    )
+    parser.add_argument("--strategies", nargs="+", default=list(bimaru.portfolio))
+    parser.add_argument("--sizes", nargs="*", type=int, default=[])
+    parser.add_argument("--puzzles", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    puzzles = []
+    for family in args.families:
+        for path in sorted(glob.glob(os.path.join(tests_dir, family + "*.txt"))):
+            with open(path) as file:
+                puzzles.append(bimaru.Puzzle.parse(file))
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        for _ in range(args.puzzles):
+            puzzles.append(generate(size, get_fleet(size), 0.1, rng))
+
+    times = {strategy: [] for strategy in args.strategies + ["portfolio"]}
+    timeouts, wins = Counter(), Counter()
+    for puzzle in puzzles:
+        for strategy in args.strategies:
+            elapsed, winner = race(puzzle, [strategy], args.timeout)
+            times[strategy].append(elapsed)
+            timeouts[strategy] += winner is None
+        elapsed, winner = race(puzzle, args.strategies, args.timeout)
+        times["portfolio"].append(elapsed)
+        timeouts["portfolio"] += winner is None
+        wins[winner] += 1
+
+    print(f"{len(puzzles)} puzzles")
+    print(
+        f"{'strategy':20s} {'mean':>8s} {'p95':>8s} {'longest':>8s} "
+        f"{'timeouts':>8s} {'wins':>6s}"
+    )
+    for strategy, strategy_times in times.items():
+        mean, p95, longest = summarize(strategy_times)
+        won = "" if strategy == "portfolio" else wins[strategy]
+        print(
+            f"{strategy:20s} {mean:7.3f}s {p95:7.3f}s {longest:7.3f}s "
+            f"{timeouts[strategy]:8d} {won:>6}"
+        )
@@ -0,0 +1,111 @@
+# File: scaling.py
+# Description: Measures how the solver scales with the size of the board and
+#   of the fleet, by generating random puzzles of each size (placing the
+#   fleet at random and revealing some of its cells as hints) and reporting
+#   the time taken to solve them and the number of nodes expanded.
+# Usage: python3 bench/scaling.py [--sizes 10 15 20] [--puzzles N]
+#   [--hints RATIO] [--search lazy] [--seed S]
+
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from search_core import InstrumentedProblem
+
+
+def get_fleet(board_size: int):
+    """Returns the fleet used for a board of the given size: the usual fleet
+    of ten boats on a 10x10 board, with a longer boat for every 5 extra rows
+    and one more boat of each smaller size."""
+    longest = 4 + max(0, board_size - 10) // 5
+    return (0,) + tuple(range(longest, 0, -1))
+
+
+def generate(board_size: int, fleet, hint_ratio: float, rng: random.Random):
+    """Returns a random puzzle with the given fleet. The boats are placed from
+    the longest to the shortest, starting over when one of them doesn't fit,
+    and a ratio of the cells of the solution is revealed as hints."""
+    while True:
+        cells = [["w"] * board_size for _ in range(board_size)]
+        if place_fleet(cells, fleet, rng):
+            break
+    rows = [sum(val != "w" for val in line) for line in cells]
+    cols = [sum(line[col] != "w" for line in cells) for col in range(board_size)]
+    positions = [(row, col) for row in range(board_size) for col in range(board_size)]
+    hints = [
+        (row, col, cells[row][col].upper())
+        for row, col in rng.sample(positions, round(hint_ratio * len(positions)))
+    ]
+    return bimaru.Puzzle(rows, cols, hints, fleet)
+
+
+def is_free(cells, row: int, col: int, size: int, d_row: int, d_col: int):
+    """Checks if a boat can be placed at the given position without touching
+    the boats already on the grid of cells."""
+    board_size = len(cells)
+    rows = range(max(row - 1, 0), min(row + size * d_row + 2, board_size))
+    cols = range(max(col - 1, 0), min(col + size * d_col + 2, board_size))
+    return all(cells[r][c] == "w" for r in rows for c in cols)
+
+
+def place_fleet(cells, fleet, rng: random.Random, tries=100):
+    """Places every boat of the fleet at random on the grid of cells, with
+    no two boats touching. Returns False if some boat couldn't be placed."""
+    board_size = len(cells)
+    for size in reversed(range(1, len(fleet))):
+        for _ in range(fleet[size]):
+            for _ in range(tries):
+                d_row, d_col = rng.choice(((0, 1), (1, 0)))
+                row = rng.randrange(board_size - d_row * (size - 1))
+                col = rng.randrange(board_size - d_col * (size - 1))
+                if is_free(cells, row, col, size, d_row, d_col):
+                    break
+            else:
+                return False
+            for i in range(size):
+                if size == 1:
+                    val = "c"
+                elif i == 0:
+                    val = "l" if d_col else "t"
+                elif i == size - 1:
+                    val = "r" if d_col else "b"
+                else:
+                    val = "m"
+                cells[row + i * d_row][col + i * d_col] = val
+    return True
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmarks the solver on larger boards.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 15, 20])
+    parser.add_argument("--puzzles", type=int, default=5, help="puzzles per size")
+    parser.add_argument("--hints", type=float, default=0.3, help="ratio of hints")
+    parser.add_argument("--search", choices=bimaru.searchers, default="lazy")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'size':>4s} {'fleet':>20s} {'boats':>5s} {'time':>9s} {'nodes':>8s}")
+    for board_size in args.sizes:
+        fleet = get_fleet(board_size)
+        elapsed = nodes = 0
+        for _ in range(args.puzzles):
+            puzzle = generate(board_size, fleet, args.hints, rng)
+            start = time.perf_counter()
+            board = bimaru.Board.from_puzzle(puzzle)
+            symmetry = args.search != "backjumping"
+            problem = InstrumentedProblem(bimaru.Bimaru(board, symmetry=symmetry))
+            if bimaru.searchers[args.search](problem) is None:
+                sys.exit(f"no solution found for a {board_size}x{board_size} puzzle")
+            elapsed += time.perf_counter() - start
+            nodes += problem.succs
+        print(
+            f"{board_size:4d} {' '.join(map(str, fleet[1:])):>20s} "
+            f"{sum(fleet):5d} {elapsed / args.puzzles:8.3f}s "
+            f"{nodes / args.puzzles:8.1f}"
+        )
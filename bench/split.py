@@ -0,0 +1,73 @@
+# File: split.py
+# Description: Compares the split search, which hands subtrees of the
+#   search tree to a pool of processes, with the same strategy in a single
+#   process, on random puzzles of the given board sizes, reporting the mean,
+#   95th percentile and longest time taken by a puzzle, along with the
+#   number of subtrees and the bytes of shared memory they took. The boards
+#   found are checked against the rules.
+# Usage: python3 bench/split.py [--sizes 15 20] [--puzzles N]
+#   [--strategy lazy] [--workers 4] [--seed S]
+
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import bimaru
+from branching import is_solution
+from portfolio import summarize
+from scaling import generate, get_fleet
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares the split search with one process.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[15, 20])
+    parser.add_argument("--puzzles", type=int, default=10)
+    parser.add_argument("--strategy", default="lazy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    search, branching, ordering = bimaru.parse_strategy(args.strategy)
+
+    rng = random.Random(args.seed)
+    print(
+        f"{'size':>4s} {'mode':8s} {'mean':>8s} {'p95':>8s} {'longest':>8s} "
+        f"{'subtrees':>8s} {'bytes':>8s}"
+    )
+    for size in args.sizes:
+        puzzles = [
+            generate(size, get_fleet(size), 0.1, rng) for _ in range(args.puzzles)
+        ]
+        single, split, subtrees, record_bytes = [], [], 0, 0
+        for puzzle in puzzles:
+            start = time.perf_counter()
+            board = bimaru.Board.from_puzzle(puzzle)
+            problem = bimaru.Bimaru(board, branching, ordering, search != "backjumping")
+            goal_node = bimaru.searchers[search](problem)
+            single.append(time.perf_counter() - start)
+            if goal_node is None or not is_solution(puzzle, goal_node.state.board):
+                sys.exit(f"{args.strategy} didn't solve a puzzle")
+
+            start = time.perf_counter()
+            board = bimaru.solve_split(puzzle, args.strategy, args.workers)
+            split.append(time.perf_counter() - start)
+            if board is None or not is_solution(puzzle, board):
+                sys.exit(f"the split {args.strategy} didn't solve a puzzle")
+
+            board = bimaru.Board.from_puzzle(puzzle)
+            problem = bimaru.Bimaru(board, branching, ordering, search != "backjumping")
+            _, nodes = bimaru.split_problem(problem, 4 * args.workers)
+            subtrees += len(nodes)
+            record_bytes += len(nodes) * sum(puzzle.get_record_sizes())
+        for mode, times in (("single", single), ("split", split)):
+            mean, p95, longest = summarize(times)
+            extra = (
+                f" {subtrees / len(puzzles):8.1f} {record_bytes / len(puzzles):8.0f}"
+                if mode == "split"
+                else ""
+            )
+            print(
+                f"{size:4d} {mode:8s} {mean:7.3f}s {p95:7.3f}s {longest:7.3f}s{extra}"
+            )
@@ -0,0 +1,142 @@
+# File: startup.py
+# Description: Measures the cold start of the solver: the time a fresh
+#   interpreter takes to import bimaru.py, from python -X importtime, and
+#   the modules taking the longest, and the time python3 src/bimaru.py
+#   takes to solve an instance from start to end, next to the time of an
+#   interpreter doing nothing, over a few runs each (after compiling the
+#   bytecode, as an installed solver would have it). By default, the
+#   budget of the solver is a multiple of the time of the bare interpreter,
+#   so it holds on faster and slower machines alike. The medians can also
+#   be saved as a baseline, measured on the same machine, and the budget
+#   is then that baseline plus some headroom for the noise between runs
+#   (or set with --budget). Exits with an error if a median goes over its
+#   budget or if any of the modules kept off the import path (numpy and the
+#   AIMA code, multiprocessing, which only the parallel modes need, or glob
+#   and json, which only --batch needs) gets imported, so regressions are
+#   caught early.
+# Usage: python3 bench/startup.py [--runs N] [--top N] [--instance FILE]
+#   [--ratio R | --budget MS | --compare BASELINE [--headroom FRACTION]]
+#   [--output FILE]
+
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+src_dir = os.path.join(os.path.dirname(__file__), "..", "src")
+tests_dir = os.path.join(os.path.dirname(__file__), "..", "tests")
+
+
+def import_times(module: str):
+    """Imports the module in a fresh interpreter and returns the self and
+    cumulative times (in ms) of every module imported, by name."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=src_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(own) / 1000, int(cumulative) / 1000
+    return times
+
+
+def run_time(command, instance=None):
+    """Runs the command, with the instance as its standard input, if any,
+    and returns the time (in ms) it took from start to end."""
+    with open(instance or os.devnull) as file:
+        start = time.perf_counter()
+        subprocess.run(command, stdin=file, stdout=subprocess.DEVNULL, check=True)
+        return 1000 * (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measures the cold start of the solver.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument(
+        "--forbid",
+        nargs="*",
+        default=["numpy", "utils", "search", "multiprocessing", "glob", "json"],
+    )
+    parser.add_argument(
+        "--instance",
+        default=os.path.join(tests_dir, "T01.txt"),
+        help="instance the solver is started on (default: tests/T01.txt)",
+    )
+    parser.add_argument(
+        "--ratio",
+        type=float,
+        default=6.0,
+        help="fail if the solver takes longer than RATIO times the bare "
+        "interpreter (default: 6)",
+    )
+    parser.add_argument(
+        "--budget", type=float, metavar="MS", help="fail if the solver takes over MS"
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="BASELINE",
+        help="fail if a median goes over the one saved in BASELINE plus the "
+        "headroom",
+    )
+    parser.add_argument("--headroom", type=float, default=0.3, metavar="FRACTION")
+    parser.add_argument("--output", metavar="FILE", help="save the medians")
+    args = parser.parse_args()
+    if args.compare and args.budget is not None:
+        parser.error("--budget can't be used with --compare")
+
+    compileall.compile_dir(src_dir, quiet=1)
+    runs = [import_times("bimaru") for _ in range(args.runs)]
+    imported = statistics.median(times["bimaru"][1] for times in runs)
+    print(f"import bimaru: {imported:.1f}ms (median of {args.runs} runs)")
+    print(f"{'module':30s} {'self':>8s} {'cumulative':>10s}")
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)
+    for name, (own, cumulative) in slowest[: args.top]:
+        print(f"{name:30s} {own:6.1f}ms {cumulative:8.1f}ms")
+
+    # Taking turns, so both get the same share of whatever else is running
+    bare, solver = [], []
+    command = [sys.executable, os.path.join(src_dir, "bimaru.py")]
+    for _ in range(args.runs):
+        bare.append(run_time([sys.executable, "-c", "pass"]))
+        solver.append(run_time(command, args.instance))
+    bare, solver = statistics.median(bare), statistics.median(solver)
+    print(f"bare interpreter: {bare:.1f}ms")
+    print(
+        f"bimaru.py < {os.path.basename(args.instance)}: {solver:.1f}ms "
+        f"({solver / bare:.1f}x the bare interpreter)"
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            medians = {"import": imported, "solver": solver}
+            json.dump({"python": sys.version.split()[0], **medians}, file)
+
+    loaded = [name for name in args.forbid if name in runs[-1]]
+    if loaded:
+        sys.exit(f"imported {', '.join(loaded)}, which the solver shouldn't need")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        budgets = {
+            key: (1 + args.headroom) * baseline[key] for key in ("import", "solver")
+        }
+    elif args.budget is not None:
+        budgets = {"solver": args.budget}
+    else:
+        budgets = {"solver": args.ratio * bare}
+    for key, median in (("import", imported), ("solver", solver)):
+        if key in budgets and median > budgets[key]:
+            sys.exit(
+                f"{key} start of {median:.1f}ms over its budget of "
+                f"{budgets[key]:.1f}ms"
+            )
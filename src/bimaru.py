@@ -4,415 +4,1247 @@
 #   103124 Gonçalo Bárias
 #   102624 Raquel Braunschweig
 
-from sys import stdin
-from search import (
+from array import array
+from collections import deque
+from functools import lru_cache, partial
+from itertools import count, product
+from os import cpu_count, path
+from random import Random
+import re
+from sys import stderr, stdin, stdout
+from time import perf_counter, time_ns
+from search_core import (
+    InstrumentedProblem,
     Problem,
     Node,
     astar_search,
     breadth_first_tree_search,
+    depth_first_backjumping_search,
+    depth_first_backtracking_search,
+    depth_first_lazy_search,
     depth_first_tree_search,
     greedy_search,
     recursive_best_first_search,
+    TranspositionTable,
 )
 
-rows_fixed_num, cols_fixed_num = (), ()
-boat_piece_vals = ("t", "b", "l", "r", "c", "m", "x")
-water_vals = ("w", ".")
-incomp_vals = ("?", "x")
+# argparse, glob, json, multiprocessing and the dlx and sat backends are
+# imported where they are used, so solving a puzzle doesn't load them (see
+# bench/startup.py)
+
+# Cells are stored as small integer codes, boat pieces having the highest ones
+UNKNOWN, WATER, BOAT, TOP, BOTTOM, LEFT, RIGHT, CENTER, MIDDLE = range(9)
+cell_codes = {
+    "?": UNKNOWN,
+    ".": WATER,
+    "w": WATER,
+    "x": BOAT,
+    "t": TOP,
+    "b": BOTTOM,
+    "l": LEFT,
+    "r": RIGHT,
+    "c": CENTER,
+    "m": MIDDLE,
+}
+cell_vals = "?.xtblrcm"
+hint_vals = "?WXTBLRCM"
+# Symbols of the cells as seen along a row and along a column, by cell code:
+# the start, end and middle of a boat along the line, a boat taking a single
+# cell of the line and a boat piece of unknown type
+row_symbols = bytes.maketrans(bytes(range(9)), b"?.xoo<>om")
+col_symbols = bytes.maketrans(bytes(range(9)), b"?.x<>ooom")
+# Runs of known boat pieces between water, i.e., the boats already on a line
+known_runs = re.compile(rb"(?<![^.])[^?.]+(?![^.])")
 orientation_vecs = {
-    "t": (1, 0, "b"),
-    "b": (-1, 0, "t"),
-    "l": (0, 1, "r"),
-    "r": (0, -1, "l"),
-    "c": (0, 0, "c"),
+    TOP: (1, 0, BOTTOM),
+    BOTTOM: (-1, 0, TOP),
+    LEFT: (0, 1, RIGHT),
+    RIGHT: (0, -1, LEFT),
+    CENTER: (0, 0, CENTER),
 }
+# Value of the end of a boat by the direction the rest of the boat is in
+end_vals = {
+    (d_row, d_col): cell_vals[code]
+    for code, (d_row, d_col, _) in orientation_vecs.items()
+}
+# The eight symmetries of a square board: whether it is transposed and then
+# whether its rows and whether its columns are reversed
+symmetries = tuple(product((False, True), repeat=3))
+
+
+def bit_indices(mask: int):
+    """Yields the indices of the bits set in the given mask, from the least
+    significant to the most significant one."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def transform_cell(size: int, symmetry: tuple, row: int, col: int):
+    """Returns the cell that the symmetry takes the given cell of a board of
+    the given size to."""
+    transpose, flip_rows, flip_cols = symmetry
+    if transpose:
+        row, col = col, row
+    return size - 1 - row if flip_rows else row, size - 1 - col if flip_cols else col
+
+
+def transform_value(symmetry: tuple, val: str):
+    """Returns the value, of a hint or of a cell of a printed board, that the
+    symmetry turns the given one into: the ends of the boats turn along with
+    the board, keeping their case, and the other values stay the same."""
+    code = cell_codes.get(val.lower())
+    if code not in orientation_vecs:
+        return val
+    transpose, flip_rows, flip_cols = symmetry
+    d_row, d_col, _ = orientation_vecs[code]
+    if transpose:
+        d_row, d_col = d_col, d_row
+    end = end_vals[-d_row if flip_rows else d_row, -d_col if flip_cols else d_col]
+    return end.upper() if val.isupper() else end
+
+
+def transform_solution(solution: str, symmetry: tuple):
+    """Returns the board, as printed, that the symmetry turns the given one
+    into."""
+    lines = solution.split("\n")
+    size = len(lines)
+    cells = [[None] * size for _ in range(size)]
+    for row, line in enumerate(lines):
+        for col, val in enumerate(line):
+            new_row, new_col = transform_cell(size, symmetry, row, col)
+            cells[new_row][new_col] = transform_value(symmetry, val)
+    return "\n".join(map("".join, cells))
+
+
+def invert_symmetry(symmetry: tuple):
+    """Returns the symmetry that undoes the given one. Reversing the rows
+    and then transposing is the same as transposing and then reversing the
+    columns, so only the transposing ones aren't their own inverse."""
+    transpose, flip_rows, flip_cols = symmetry
+    return (True, flip_cols, flip_rows) if transpose else symmetry
+
+
+def parse_counts(line: str):
+    """Returns the counts in a ROW or COLUMN line of the input format. The
+    label at the start of the line is optional."""
+    vals = line.split()
+    if vals and not vals[0].isdigit():
+        vals = vals[1:]
+    return tuple(map(int, vals))
+
+
+def parse_fleet(line: str):
+    """Returns the fleet in a FLEET line of the input format, i.e., the number
+    of boats of each size, indexed by size (so the first entry is always 0).
+    The line has the number of boats of size 1, 2, and so on."""
+    return (0,) + parse_counts(line)
+
+
+def parse_hint(line: str):
+    """Returns the (row, column, value) tuple of a HINT line of the input
+    format. The label at the start of the line is optional."""
+    vals = line.split()
+    if vals and vals[0] == "HINT":
+        vals = vals[1:]
+    if len(vals) != 3:
+        raise ValueError(f"invalid hint: {line.strip()!r}")
+    return int(vals[0]), int(vals[1]), vals[2]
+
+
+@lru_cache(maxsize=None)
+def get_line_masks(board_size: int):
+    """Returns the masks of the cells of each line, i.e., of each row followed
+    by each column."""
+    stride = board_size + 2
+    rows = tuple(
+        sum(1 << ((row + 1) * stride + col + 1) for col in range(board_size))
+        for row in range(board_size)
+    )
+    cols = tuple(
+        sum(1 << ((row + 1) * stride + col + 1) for row in range(board_size))
+        for col in range(board_size)
+    )
+    return rows + cols
+
+
+@lru_cache(maxsize=None)
+def get_piece_offsets(board_size: int):
+    """Returns, for each extreme boat piece, the offset to the next piece of
+    its boat, the offset to one of its sides and the opposite extreme."""
+    stride = board_size + 2
+    return {
+        piece: (d_row * stride + d_col, d_col * stride + d_row, o_extreme)
+        for piece, (d_row, d_col, o_extreme) in orientation_vecs.items()
+    }
+
+
+@lru_cache(maxsize=None)
+def get_boat_masks(board_size: int, row: int, col: int, size: int, orientation: str):
+    """Returns the bitmask of the cells taken by a boat and the bitmask of its
+    halo, i.e., the cells that touch the boat vertically, horizontally or
+    diagonally. Bits follow the layout of the board cells, which pad every
+    side of the board with one extra cell, so the halo never wraps around."""
+    stride = board_size + 2
+    d_row, d_col, _ = orientation_vecs[cell_codes[orientation]]
+    ship = halo = 0
+    for _ in range(size):
+        idx = (row + 1) * stride + col + 1
+        ship |= 1 << idx
+        for offset in (-stride - 1, -stride, -stride + 1, -1, 1):
+            halo |= 1 << (idx + offset)
+        for offset in (stride - 1, stride, stride + 1):
+            halo |= 1 << (idx + offset)
+        row += d_row
+        col += d_col
+    return ship, halo & ~ship
+
+
+@lru_cache(maxsize=None)
+def get_placement_index(board_size: int, longest: int):
+    """Returns the index of every placement of the boats up to the given size,
+    each one identified by its position in it. Placements are ordered by size
+    and then as they are tried by get_placements_for_boat. The index has the
+    actions of the placements, the line each one is on, the mask of the
+    placements of each size, the mask of the boat of each placement and, for
+    each cell, the watch masks of the
+    placements whose boat takes that cell and of the ones whose halo takes
+    it, i.e., the ones that may stop being valid when the cell changes."""
+    actions, lines, size_masks = [], [], [0]
+    for size in range(1, longest + 1):
+        first = len(actions)
+        for diag in range(board_size):
+            orientation = "c" if size == 1 else "l"
+            for col in range(board_size - size + 1):
+                actions.append((diag, col, size, orientation))
+                lines.append(diag)
+            orientation = "c" if size == 1 else "t"
+            for row in range(board_size - size + 1):
+                actions.append((row, diag, size, orientation))
+                lines.append(board_size + diag)
+        size_masks.append((1 << len(actions)) - (1 << first))
+
+    ship_watched = [[] for _ in range((board_size + 2) ** 2)]
+    halo_watched = [[] for _ in range((board_size + 2) ** 2)]
+    ship_masks = []
+    for pid, action in enumerate(actions):
+        ship, halo = get_boat_masks(board_size, *action)
+        ship_masks.append(ship)
+        for idx in bit_indices(ship):
+            ship_watched[idx].append(pid)
+        for idx in bit_indices(halo):
+            halo_watched[idx].append(pid)
+    ship_watches = tuple(sum(1 << pid for pid in pids) for pids in ship_watched)
+    halo_watches = tuple(sum(1 << pid for pid in pids) for pids in halo_watched)
+    return (
+        tuple(actions),
+        tuple(lines),
+        tuple(size_masks),
+        tuple(ship_masks),
+        ship_watches,
+        halo_watches,
+    )
+
+
+def get_line_options(line: bytes, count: int, fleet: tuple, pos: int, memo: dict):
+    """Returns the masks (by position) of the cells of the line from the
+    given position on that have a boat piece in some pattern of that part
+    of the line with the given number of boat cells and of the ones that
+    have water in some of them, or None if it has no pattern. A pattern is
+    made of runs of boat cells between water, each one as long as some boat
+    of the fleet (or a single cell, which can be a boat across the line) and
+    compatible with the symbols of its cells, and water in
+    the rest, where the line has no boat piece. Every part of the line is
+    only solved once for each count, with the memo."""
+    if (pos, count) in memo:
+        return memo[pos, count]
+    size, options = len(line), None
+    if count == 0:
+        if not line[pos:].strip(b"?."):
+            options = (0, (1 << size) - (1 << pos) if pos < size else 0)
+    elif 0 < count <= size - pos:
+        maybe_boat = maybe_water = 0
+        if line[pos] in b"?.":
+            rest = get_line_options(line, count, fleet, pos + 1, memo)
+            if rest is not None:
+                maybe_boat, maybe_water = rest[0], rest[1] | 1 << pos
+        for length in range(1, min(count, size - pos, len(fleet) - 1) + 1):
+            end = pos + length - 1
+            # The cell before the last one has to be the start or the middle
+            inner = b"?x<" if length == 2 else b"?xm"
+            if line[end] == ord(".") or length > 1 and line[end - 1] not in inner:
+                break  # no longer run fits here
+            if end + 1 < size and line[end + 1] not in b"?.":
+                continue  # the run must end in water
+            # A single cell can also be the cross-section of a boat across
+            # the line, so it only needs some boat in the fleet
+            if length == 1:
+                if not any(fleet) or line[end] in b"<>":
+                    continue
+            elif not fleet[length] or line[end] in b"<om":
+                continue
+            rest = get_line_options(line, count - length, fleet, end + 2, memo)
+            if rest is not None:
+                maybe_boat |= rest[0] | ((1 << length) - 1) << pos
+                maybe_water |= rest[1] | (1 << end + 1 if end + 1 < size else 0)
+        if maybe_boat:
+            options = (maybe_boat, maybe_water)
+    memo[pos, count] = options
+    return options
+
+
+@lru_cache(maxsize=1 << 14)
+def solve_line(line: bytes, count: int, fleet: tuple):
+    """Returns the masks (by position) of the unknown cells of the line that
+    have a boat piece and of the ones that have water in every pattern of the
+    line with the given count, or None if it has no pattern. Lines with the
+    same symbols and count come up again and again during a search, so the
+    results are cached."""
+    options = get_line_options(line, count, fleet, 0, {})
+    if options is None:
+        return None
+    unknown = sum(1 << pos for pos, symbol in enumerate(line) if symbol == ord("?"))
+    return unknown & ~options[1], unknown & ~options[0]
+
+
+def fix_line(line: bytes, count: int, fleet: tuple):
+    """Returns the masks of the cells of the line that solve_line fixes, or
+    None if the line has no pattern. The boats already on the line are taken
+    out of it and of its count and the water at its ends is stripped before
+    solving it, so that many more lines share the same cached results."""
+    for run in known_runs.findall(line):
+        if solve_line(run, len(run), fleet) is None:
+            return None  # not a boat of the fleet
+        count -= len(run)
+    line = known_runs.sub(lambda match: b"." * len(match[0]), line)
+    start = len(line) - len(line.lstrip(b"."))
+    fixed = solve_line(line.strip(b"."), count, fleet)
+    if fixed is None:
+        return None
+    return fixed[0] << start, fixed[1] << start
+
+
+@lru_cache(maxsize=None)
+def get_zobrist_keys(board_size: int, longest: int):
+    """Returns the random 64-bit keys of the Zobrist hashes of the boards of
+    the given size: one for each cell code at each position and one for each
+    boat size. The keys are always the same for the same board size."""
+    rng, stride = Random(board_size), board_size + 2
+    cell_keys = tuple(
+        tuple(rng.getrandbits(64) for _ in range(stride * stride)) for _ in cell_vals
+    )
+    boat_keys = tuple(rng.getrandbits(64) for _ in range(longest + 1))
+    return cell_keys, boat_keys
+
+
+@lru_cache(maxsize=None)
+def get_placement_conflicts(board_size: int, longest: int):
+    """Returns, for each placement of the index, the mask of the placements
+    that can't be on the board with it, i.e., the ones whose boat takes a
+    cell of its boat or halo, or whose halo takes a cell of its boat."""
+    index = get_placement_index(board_size, longest)
+    actions, ship_watches, halo_watches = index[0], index[4], index[5]
+    conflicts = []
+    for action in actions:
+        ship, halo = get_boat_masks(board_size, *action)
+        mask = 0
+        for idx in bit_indices(ship):
+            mask |= ship_watches[idx] | halo_watches[idx]
+        for idx in bit_indices(halo):
+            mask |= ship_watches[idx]
+        conflicts.append(mask)
+    return tuple(conflicts)
+
+
+class Puzzle:
+    """Context of a Bimaru puzzle, shared by every board of it: the row and
+    column counts, the fleet, the hints and the layout of the board cells.
+    The lines of a board are its rows followed by its columns."""
+
+    __slots__ = (
+        "size",
+        "stride",
+        "rows_fixed_num",
+        "cols_fixed_num",
+        "lines_fixed_num",
+        "fleet",
+        "counter_type",
+        "hints",
+        "hints_mask",
+        "touching_offsets",
+        "diagonal_offsets",
+        "piece_offsets",
+        "line_masks",
+        "placements",
+        "placement_masks",
+        "ship_masks",
+        "ship_watches",
+        "halo_watches",
+        "placements_mask",
+        "distinct_mask",
+        "placement_ids",
+        "placement_bits",
+        "cell_keys",
+        "boat_keys",
+    )
+
+    def __init__(self, rows_fixed_num, cols_fixed_num, hints=(), fleet=(0, 4, 3, 2, 1)):
+        """The hints are (row, column, value) tuples and the fleet has the
+        number of boats of each size, indexed by size. The board can have any
+        size, given by the number of row counts, and the fleet any number of
+        boats of any size. Raises a ValueError if a hint is off the board or
+        has no cell value."""
+        self.size = size = len(rows_fixed_num)
+        if len(cols_fixed_num) != size:
+            raise ValueError("the board must have as many rows as columns")
+        self.stride = stride = size + 2
+        self.rows_fixed_num = tuple(rows_fixed_num)
+        self.cols_fixed_num = tuple(cols_fixed_num)
+        self.lines_fixed_num = self.rows_fixed_num + self.cols_fixed_num
+        self.fleet = tuple(fleet)
+        # Counters of the lines need more than a byte on very large boards
+        self.counter_type = "B" if size < 256 else "H"
+        self.hints = tuple((int(row), int(col), val) for row, col, val in hints)
+        for row, col, val in self.hints:
+            if not (0 <= row < size and 0 <= col < size):
+                raise ValueError(f"hint off the board: {row} {col}")
+            if not isinstance(val, str) or cell_codes.get(val.lower(), 0) == UNKNOWN:
+                raise ValueError(f"invalid hint value: {val!r}")
+        self.hints_mask = 0
+        for row, col, _ in self.hints:
+            self.hints_mask |= 1 << ((row + 1) * stride + col + 1)
+        self.touching_offsets = (-stride, 1, stride, -1)
+        self.diagonal_offsets = (-stride - 1, -stride + 1, stride + 1, stride - 1)
+        self.piece_offsets = get_piece_offsets(size)
+        self.line_masks = get_line_masks(size)
+        # Placements on a line with a lower count than the size of the boat
+        # are left out of the index from the start
+        longest = len(self.fleet) - 1
+        (
+            self.placements,
+            lines,
+            self.placement_masks,
+            self.ship_masks,
+            self.ship_watches,
+            self.halo_watches,
+        ) = get_placement_index(size, longest)
+        self.placements_mask = sum(
+            1 << pid
+            for pid, (line, action) in enumerate(zip(lines, self.placements))
+            if self.lines_fixed_num[line] >= action[2]
+        )
+        # Submarines are in the index twice, once for each orientation
+        vertical_submarines = sum(
+            1 << pid
+            for pid, line in enumerate(lines)
+            if line >= size and self.placements[pid][2] == 1
+        )
+        self.distinct_mask = self.placements_mask & ~vertical_submarines
+        self.placement_ids, self.placement_bits = {}, {}
+        for pid, action in enumerate(self.placements):
+            self.placement_ids.setdefault(action, pid)
+            self.placement_bits[action] = self.placement_bits.get(action, 0) | 1 << pid
+        self.cell_keys, self.boat_keys = get_zobrist_keys(size, longest)
+
+    def get_record_sizes(self):
+        """Returns the number of bytes of each part of a board of the puzzle
+        packed by Board.encode: its cells, its boats left and its live and
+        dirty masks."""
+        cells_size = self.stride * self.stride
+        return (
+            cells_size,
+            len(self.fleet) * array("h").itemsize,
+            (len(self.placements) + 7) // 8,
+            (cells_size + 7) // 8,
+        )
+
+    def get_fingerprint(self):
+        """Returns a fingerprint of the clues of the puzzle (its counts, fleet
+        and hints), which is the same for all of its rotations and
+        reflections, and the symmetry taking the puzzle to the one of them
+        it was taken of: the one whose clues come first, in their canonical
+        form, so that a solution of it can be turned back into a solution of
+        any of them."""
+        from hashlib import sha256
+
+        forms = []
+        for symmetry in symmetries:
+            transpose, flip_rows, flip_cols = symmetry
+            rows, cols = self.rows_fixed_num, self.cols_fixed_num
+            if transpose:
+                rows, cols = cols, rows
+            hints = sorted(
+                transform_cell(self.size, symmetry, row, col)
+                + (transform_value(symmetry, val.upper()),)
+                for row, col, val in self.hints
+            )
+            rows = rows[::-1] if flip_rows else rows
+            cols = cols[::-1] if flip_cols else cols
+            forms.append((repr((rows, cols, self.fleet, hints)), symmetry))
+        form, symmetry = min(forms)
+        return sha256(form.encode()).hexdigest(), symmetry
+
+    @staticmethod
+    def parse(lines):
+        """Reads a puzzle in the input format of parse_instance from an
+        iterable of lines, such as a file or the lines of a string. Without a
+        FLEET line, the puzzle has the usual fleet of ten boats."""
+        lines = iter(lines)
+        rows_fixed_num = parse_counts(next(lines))
+        cols_fixed_num = parse_counts(next(lines))
+        line, fleet = next(lines), (0, 4, 3, 2, 1)
+        if line.startswith("FLEET"):
+            line, fleet = next(lines), parse_fleet(line)
+        hint_total = int(line)
+        hints = [parse_hint(next(lines)) for _ in range(hint_total)]
+        return Puzzle(rows_fixed_num, cols_fixed_num, hints, fleet)
 
 
 class Board:
-    """Internal representation of a Bimaru board."""
+    """Internal representation of a Bimaru board. The cells are kept in a
+    flat bytearray of cell codes, row after row, with a border of water around
+    the board, so the neighbours of a cell are always at the same offsets and
+    never out of bounds. Positions are referred to by their index in it.
+    Besides the cells, the board keeps bitmasks of the boat, water and unknown
+    cells (and of the boat pieces whose type is known), so that placements can
+    be checked with a couple of AND operations. When the trail is active,
+    every change is recorded on it so that it can be undone when
+    backtracking. Boards are slotted and keep their counters in arrays of
+    bytes, indexed by line (the rows and then the columns), since a search
+    can hold a large number of them at once.
+    The board also keeps the mask of the placements of the puzzle index that
+    are still live, i.e., that were valid the last time they were checked,
+    and the mask of the cells changed since then. A placement only stops
+    being valid when a cell of its boat or halo changes, so only the
+    placements watching those cells have to be checked again. Copies inherit
+    both masks from their parent.
+    Boards are hashed incrementally, with the Zobrist keys of the puzzle: the
+    hash is the sum of the keys of the code of every cell and of every boat
+    left to place, relative to the ones of the board with nothing known, and
+    is updated with every change to them. Boards that only differ in the
+    order the same changes were made in have the same hash."""
+
+    __slots__ = (
+        "size",
+        "stride",
+        "cells",
+        "puzzle",
+        "is_invalid",
+        "trail",
+        "boat_mask",
+        "water_mask",
+        "pieces_mask",
+        "unknown_mask",
+        "live_mask",
+        "dirty_mask",
+        "boat_pieces_num",
+        "water_num",
+        "boats_num",
+        "hash",
+    )
 
-    def __init__(self, cells):
-        """The board consists of cells with initial constraints."""
-        self.cells = cells
-        self.size = len(cells)
+    def __init__(self, puzzle: Puzzle):
+        """The board starts with every cell unknown and the whole fleet of
+        the puzzle to be placed."""
+        self.puzzle = puzzle
+        self.size = size = puzzle.size
+        self.stride = stride = puzzle.stride
+        self.cells = bytearray([WATER]) * (stride * stride)
         self.is_invalid = False
+        self.trail = None
+        self.boat_mask = self.water_mask = self.pieces_mask = 0
+        self.unknown_mask = 0
+        # Every placement in the index is valid on a board with no known cells
+        self.live_mask, self.dirty_mask = puzzle.placements_mask, 0
+        for row_mask in puzzle.line_masks[:size]:
+            self.unknown_mask |= row_mask
+        for idx in bit_indices(self.unknown_mask):
+            self.cells[idx] = UNKNOWN
+        self.boat_pieces_num = array(puzzle.counter_type, [0]) * (2 * size)
+        self.water_num = array(puzzle.counter_type, [0]) * (2 * size)
+        self.boats_num = array("h", puzzle.fleet)
+        self.hash = 0
+
+    def get_index(self, row: int, col: int):
+        """Returns the index of the respective board position."""
+        return (row + 1) * self.stride + col + 1
 
     def get_value(self, row: int, col: int):
         """Returns the value in the respective board position."""
         if 0 <= row < self.size and 0 <= col < self.size:
-            return self.cells[row][col].lower()
+            return cell_vals[self.cells[self.get_index(row, col)]]
 
     def set_value(self, row: int, col: int, val: str, override=False):
         """Sets the value in the respective board position.
         If the override flag is active, it replaces the value at that position
         and doesn't count that piece."""
-        if row < 0 or row >= self.size or col < 0 or col >= self.size:
+        if 0 <= row < self.size and 0 <= col < self.size:
+            self.set_code(self.get_index(row, col), cell_codes[val.lower()], override)
+
+    def set_code(self, idx: int, code: int, override=False):
+        """Sets the cell code at the given index, if the cell is unknown.
+        If the override flag is active, it replaces the value at that position
+        and doesn't count that piece."""
+        if not override and self.cells[idx] != UNKNOWN:
             return
-        if (not override and self.get_value(row, col) == "?") or override:
-            self.cells[row][col] = val
-            if val == "x":
-                self.isolate_boat_piece(row, col, "x")
-            if not override and val.lower() in water_vals:
-                self.rows_water_num[row] += 1
-                self.cols_water_num[col] += 1
-                if self.size - self.rows_water_num[row] < rows_fixed_num[row]:
-                    self.is_invalid = True
-                if self.size - self.cols_water_num[col] < cols_fixed_num[col]:
-                    self.is_invalid = True
-            elif not override and val.lower() in boat_piece_vals:
-                self.rows_boat_pieces_num[row] += 1
-                self.cols_boat_pieces_num[col] += 1
-                if self.rows_boat_pieces_num[row] > rows_fixed_num[row]:
-                    self.is_invalid = True
-                if self.cols_boat_pieces_num[col] > cols_fixed_num[col]:
-                    self.is_invalid = True
-
-    def get_adjacent_touching_values(self, row: int, col: int):
-        return (
-            self.get_value(row - 1, col),
-            self.get_value(row, col + 1),
-            self.get_value(row + 1, col),
-            self.get_value(row, col - 1),
-        )
+        if self.trail is not None:
+            self.trail.append(("cell", idx, self.cells[idx], override))
+        self.write_cell(idx, code)
+        if code == BOAT:
+            self.isolate_boat_piece(idx, BOAT)
+        if override:
+            return
+        row, col = divmod(idx, self.stride)
+        lines_fixed_num = self.puzzle.lines_fixed_num
+        for line in (row - 1, self.size + col - 1):
+            if code == WATER:
+                self.water_num[line] += 1
+                if self.size - self.water_num[line] < lines_fixed_num[line]:
+                    self.invalidate()
+            else:
+                self.boat_pieces_num[line] += 1
+                if self.boat_pieces_num[line] > lines_fixed_num[line]:
+                    self.invalidate()
 
-    def set_adjacent_touching_values(
-        self, row: int, col: int, t: str, r: str, b: str, l: str
-    ):
-        self.set_value(row - 1, col, t)
-        self.set_value(row, col + 1, r)
-        self.set_value(row + 1, col, b)
-        self.set_value(row, col - 1, l)
-
-    def get_adjacent_diagonal_values(self, row: int, col: int):
-        """Returns the values in the two diagonals of the selected position,
-        starting from the top left diagonal positon and going
-        around clockwise."""
-        return (
-            self.get_value(row - 1, col - 1),
-            self.get_value(row - 1, col + 1),
-            self.get_value(row + 1, col + 1),
-            self.get_value(row + 1, col - 1),
-        )
+    def write_cell(self, idx: int, code: int):
+        """Writes the cell code at the given index and moves the position to
+        the masks that match it."""
+        cell_keys = self.puzzle.cell_keys
+        self.hash += cell_keys[code][idx] - cell_keys[self.cells[idx]][idx]
+        self.cells[idx] = code
+        bit = 1 << idx
+        self.dirty_mask |= bit
+        self.unknown_mask &= ~bit
+        self.water_mask &= ~bit
+        self.boat_mask &= ~bit
+        self.pieces_mask &= ~bit
+        if code == UNKNOWN:
+            self.unknown_mask |= bit
+        elif code == WATER:
+            self.water_mask |= bit
+        else:
+            self.boat_mask |= bit
+            if code != BOAT:
+                self.pieces_mask |= bit
 
-    def set_adjacent_diagonal_values(
-        self, row: int, col: int, tl: str, tr: str, bl: str, br: str
-    ):
-        self.set_value(row - 1, col - 1, tl)
-        self.set_value(row - 1, col + 1, tr)
-        self.set_value(row + 1, col + 1, br)
-        self.set_value(row + 1, col - 1, bl)
+    def invalidate(self):
+        """Marks the board as invalid, i.e., it can't lead to a solution."""
+        if not self.is_invalid:
+            if self.trail is not None:
+                self.trail.append(("invalid",))
+            self.is_invalid = True
+
+    def remove_boat(self, size: int):
+        """Updates the counter of boats after a boat of the given size was
+        completed on the board."""
+        if self.trail is not None:
+            self.trail.append(("boat", size))
+        self.boats_num[size] -= 1
+        self.hash -= self.puzzle.boat_keys[size]
+
+    def get_trail_mark(self):
+        """Returns the current position in the undo trail, starting to record
+        the changes to the board if it wasn't already doing so."""
+        if self.trail is None:
+            self.trail = []
+        return len(self.trail)
+
+    def undo(self, mark: int):
+        """Undoes every change recorded on the trail after the given mark.
+        Writes to a cell also revert the row and column counters, unless they
+        were overrides, which are never counted."""
+        trail = self.trail
+        while len(trail) > mark:
+            entry = trail.pop()
+            if entry[0] == "cell":
+                _, idx, old_code, override = entry
+                code = self.cells[idx]
+                self.write_cell(idx, old_code)
+                if override:
+                    continue
+                row, col = divmod(idx, self.stride)
+                counters = self.water_num if code == WATER else self.boat_pieces_num
+                counters[row - 1] -= 1
+                counters[self.size + col - 1] -= 1
+            elif entry[0] == "boat":
+                self.boats_num[entry[1]] += 1
+                self.hash += self.puzzle.boat_keys[entry[1]]
+            elif entry[0] == "live":
+                _, self.live_mask, self.dirty_mask = entry
+            else:
+                self.is_invalid = False
+
+    def get_adjacent_touching_values(self, idx: int):
+        """Returns the values that touch the selected position, starting from
+        the top one and going around clockwise."""
+        cells = self.cells
+        offsets = self.puzzle.touching_offsets
+        return tuple(cells[idx + offset] for offset in offsets)
+
+    def set_adjacent_touching_values(self, idx: int, t: int, r: int, b: int, l: int):
+        stride = self.stride
+        self.set_code(idx - stride, t)
+        self.set_code(idx + 1, r)
+        self.set_code(idx + stride, b)
+        self.set_code(idx - 1, l)
+
+    def has_adjacent_diagonal_boat(self, idx: int):
+        """Checks if any of the positions in the two diagonals of the selected
+        position has a boat piece."""
+        cells = self.cells
+        offsets = self.puzzle.diagonal_offsets
+        return any(cells[idx + offset] >= BOAT for offset in offsets)
+
+    def set_adjacent_diagonal_values(self, idx: int, code: int):
+        for offset in self.puzzle.diagonal_offsets:
+            self.set_code(idx + offset, code)
 
     @staticmethod
     def parse_instance():
-        global rows_fixed_num, cols_fixed_num
         """Reads the test from the standard input (stdin) that is passed as an
         argument and returns an instance of the Board class.
 
         Input format:
-            ROW <count-0> ... <count-9>
-            COLUMN <count-0> ... <count-9>
+            ROW <count-0> ... <count-n>
+            COLUMN <count-0> ... <count-n>
+            [FLEET <boats of size 1> ... <boats of size k>]
             <hint total>
             HINT <row> <column> <hint value>
         """
-        rows_info = stdin.readline().strip("\n")
-        cols_info = stdin.readline().strip("\n")
-        rows_fixed_num = tuple(map(int, rows_info.split("\t")[1:]))
-        cols_fixed_num = tuple(map(int, cols_info.split("\t")[1:]))
-        board_size = len(rows_fixed_num)
-
-        cells = [["?" for _ in range(board_size)] for _ in range(board_size)]
-        brd = Board(cells)
-        brd.boats_num = [0, 4, 3, 2, 1]
-        brd.rows_boat_pieces_num = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        brd.rows_water_num = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        brd.cols_boat_pieces_num = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        brd.cols_water_num = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-
-        hint_total = int(input())
-        for _ in range(hint_total):
-            hint = stdin.readline().strip("\n").split("\t")[1:]
-            hint_row, hint_col = int(hint[0]), int(hint[1])
-            # Inserts the hint into the board
-            brd.set_value(hint_row, hint_col, hint[2])
+        return Board.from_puzzle(Puzzle.parse(stdin))
+
+    @staticmethod
+    def from_puzzle(puzzle: Puzzle):
+        """Returns the starting board of the puzzle, with its hints inserted
+        and what can be inferred from them."""
+        brd = Board(puzzle)
+        for hint_row, hint_col, hint_val in puzzle.hints:
+            idx = brd.get_index(hint_row, hint_col)
+            code = cell_codes[hint_val.lower()]
+            # Inserts the hint into the board (it may already know a boat
+            # piece is there, but not its type)
+            brd.set_code(idx, code, brd.cells[idx] == BOAT and code > BOAT)
 
         # Isolates starting pieces and checks for initial completed boats
-        for row in range(brd.size):
-            for col in range(brd.size):
-                if brd.get_value(row, col) in boat_piece_vals:
-                    brd.isolate_boat_piece(row, col, brd.get_value(row, col))
-                if brd.get_value(row, col) in ("t", "l", "c"):
-                    brd.check_boat_completion(row, col)
+        for idx in range(brd.stride + 1, brd.stride * (brd.size + 1)):
+            if brd.cells[idx] >= BOAT:
+                brd.isolate_boat_piece(idx, brd.cells[idx])
+            if brd.cells[idx] in (TOP, LEFT, CENTER):
+                brd.check_boat_completion(idx)
 
-        return brd.reduce_board()
+        return brd.reduce_board().forward_check()
 
-    def reduce_board(self):
+    def reduce_board(self, changed=None):
         """Infers from the current board the pieces that can be placed by
-        scanning the board and the counters. When a row/column is already full,
-        it fills the rest with water. Also tries to find the 'x' boat pieces."""
-        cont = True
-        while cont:
-            cont = False
-            for diag in range(self.size):
-                if (
-                    self.size - self.rows_water_num[diag] == rows_fixed_num[diag]
-                    and self.rows_boat_pieces_num[diag] != rows_fixed_num[diag]
-                ):
-                    cont = True
-                    for col in range(self.size):
-                        self.set_value(diag, col, "x")
-                elif (
-                    self.rows_boat_pieces_num[diag] == rows_fixed_num[diag]
-                    and self.size - self.rows_water_num[diag] != rows_fixed_num[diag]
-                ):
-                    cont = True
-                    for col in range(self.size):
-                        self.set_value(diag, col, ".")
-                if (
-                    self.size - self.cols_water_num[diag] == cols_fixed_num[diag]
-                    and self.cols_boat_pieces_num[diag] != cols_fixed_num[diag]
-                ):
-                    cont = True
-                    for row in range(self.size):
-                        self.set_value(row, diag, "x")
-                elif (
-                    self.cols_boat_pieces_num[diag] == cols_fixed_num[diag]
-                    and self.size - self.cols_water_num[diag] != cols_fixed_num[diag]
-                ):
-                    cont = True
-                    for row in range(self.size):
-                        self.set_value(row, diag, ".")
-        for row in range(self.size):
-            for col in range(self.size):
-                if self.get_value(row, col) == "x":
-                    self.find_boat_piece(row, col)
+        solving each row/column on its own: the unknown cells that have the
+        same value in every way to fill the line with boats and water that
+        respects its count and known cells are set to it. Also tries to find
+        the 'x' boat pieces. Given the mask of the cells set since the board
+        was last reduced, only the lines with those cells are solved at
+        first, since the others can't have anything new to infer."""
+        puzzle, size, stride = self.puzzle, self.size, self.stride
+        lines_fixed_num, line_masks = puzzle.lines_fixed_num, puzzle.line_masks
+        if changed is None:
+            changed = self.unknown_mask
+        while changed and not self.is_invalid:
+            unknown = self.unknown_mask
+            for line in range(2 * size):
+                line_mask = line_masks[line]
+                if not changed & line_mask or not self.unknown_mask & line_mask:
+                    continue
+                if line < size:
+                    start, step, symbols = (line + 1) * stride + 1, 1, row_symbols
+                else:
+                    start, step, symbols = stride + line - size + 1, stride, col_symbols
+                cells = bytes(self.cells[start : start + step * size : step])
+                fixed = fix_line(
+                    cells.translate(symbols), lines_fixed_num[line], puzzle.fleet
+                )
+                if fixed is None:
+                    self.invalidate()
+                    return self
+                boat, water = fixed
+                for pos in bit_indices(boat):
+                    self.set_code(start + pos * step, BOAT)
+                for pos in bit_indices(water):
+                    self.set_code(start + pos * step, WATER)
+            changed = unknown & ~self.unknown_mask
+        for idx in bit_indices(self.boat_mask & ~self.pieces_mask):
+            self.find_boat_piece(idx)
 
         return self
 
-    def check_boat_piece_isolation(self, row: int, col: int, boat_type: str):
+    def check_boat_piece_isolation(self, idx: int, boat_type: int):
         """Given a certain boat type, it checks if the surrounding diagonal
         and touching adjacent positions obey the game rules."""
-        if any(
-            val in boat_piece_vals
-            for val in self.get_adjacent_diagonal_values(row, col)
-        ):
+        if self.has_adjacent_diagonal_boat(idx):
             return False
 
-        touching_adjacents = self.get_adjacent_touching_values(row, col)
-        if boat_type in ("t", "r", "b", "l"):
-            d_row, d_col, o_extreme = orientation_vecs[boat_type]
-            o_val = self.get_value(row + d_row, col + d_col)
-            if o_val not in ("?", "x", "m", o_extreme):
-                return False
-            if self.get_value(row - d_row, col - d_col) in boat_piece_vals:
+        cells = self.cells
+        if boat_type in (TOP, RIGHT, BOTTOM, LEFT):
+            offset, side_offset, o_extreme = self.puzzle.piece_offsets[boat_type]
+            if cells[idx + offset] not in (UNKNOWN, BOAT, MIDDLE, o_extreme):
                 return False
-            if self.get_value(row + d_col, col + d_row) in boat_piece_vals:
+            if cells[idx - offset] >= BOAT:
                 return False
-            if self.get_value(row - d_col, col - d_row) in boat_piece_vals:
+            if cells[idx + side_offset] >= BOAT or cells[idx - side_offset] >= BOAT:
                 return False
-        elif boat_type == "c":
-            if any(val in boat_piece_vals for val in touching_adjacents):
+        elif boat_type == CENTER:
+            if any(val >= BOAT for val in self.get_adjacent_touching_values(idx)):
                 return False
-        elif boat_type == "m":
-            if sum(val in water_vals for val in touching_adjacents) >= 3:
+        elif boat_type == MIDDLE:
+            touching_adjacents = self.get_adjacent_touching_values(idx)
+            if touching_adjacents.count(WATER) >= 3:
                 return False
             for i in range(3):
                 if (
-                    touching_adjacents[i] in water_vals
-                    and touching_adjacents[i + 1] in water_vals
+                    touching_adjacents[i] == WATER
+                    and touching_adjacents[i + 1] == WATER
                 ) or (
-                    touching_adjacents[i] in boat_piece_vals
-                    and touching_adjacents[i + 1] in boat_piece_vals
+                    touching_adjacents[i] >= BOAT and touching_adjacents[i + 1] >= BOAT
                 ):
                     return False
-        elif boat_type == "x":
+        elif boat_type == BOAT:
+            touching_adjacents = self.get_adjacent_touching_values(idx)
             for i in range(3):
-                if (
-                    touching_adjacents[i] in boat_piece_vals
-                    and touching_adjacents[i + 1] in boat_piece_vals
-                ):
+                if touching_adjacents[i] >= BOAT and touching_adjacents[i + 1] >= BOAT:
                     return False
 
         return True
 
-    def check_boat_completion(self, row: int, col: int):
+    def check_boat_completion(self, idx: int):
         """Given an extreme piece of a boat, it checks if it is part of a
         complete boat by finding the other extreme piece. If it discovers a
         boat it updates the counter with the number of boats available."""
-        val = self.get_value(row, col)
-        if val == "c":
-            self.boats_num[1] -= 1  # it's a submarine that has size 1
+        cells = self.cells
+        val = cells[idx]
+        if val == CENTER:
+            self.remove_boat(1)  # it's a submarine that has size 1
             return
 
-        if val == "m" and self.get_value(row - 1, col) in boat_piece_vals:
-            d_row, d_col = -1, 0
-        elif val == "m" and self.get_value(row, col - 1) in boat_piece_vals:
-            d_row, d_col = 0, -1
-        elif val == "m":
+        if val == MIDDLE and cells[idx - self.stride] >= BOAT:
+            offset = -self.stride
+        elif val == MIDDLE and cells[idx - 1] >= BOAT:
+            offset = -1
+        elif val == MIDDLE:
             return
-        while val == "m":
-            row += d_row
-            col += d_col
-            val = self.get_value(row, col)
-        if val in incomp_vals or val in water_vals:
+        while val == MIDDLE:
+            idx += offset
+            val = cells[idx]
+        if val <= BOAT:
             return  # if it's not a boat piece we return
 
-        d_row, d_col, o_extreme = orientation_vecs[val]
+        offset, _, o_extreme = self.puzzle.piece_offsets[val]
         size = 2  # every other boat has two extremes besides the submarine
-        while self.get_value(row + d_row, col + d_col) == "m":
-            row += d_row
-            col += d_col
+        while cells[idx + offset] == MIDDLE:
+            idx += offset
             size += 1
-        if size > 4:
-            self.is_invalid = True
+        if size >= len(self.boats_num):
+            self.invalidate()  # longer than any boat of the fleet
             return
-        if self.get_value(row + d_row, col + d_col) == o_extreme:
-            self.boats_num[size] -= 1
+        if cells[idx + offset] == o_extreme:
+            self.remove_boat(size)
 
-    def isolate_boat_piece(self, row: int, col: int, boat_type: str):
+    def isolate_boat_piece(self, idx: int, boat_type: int):
         """Depending on the boat type, it isolates them according to the game
         rules. Also checks if a boat piece is not isolated, making the
         board invalid."""
-        if not self.check_boat_piece_isolation(row, col, boat_type):
-            self.is_invalid = True
+        if not self.check_boat_piece_isolation(idx, boat_type):
+            self.invalidate()
             return
 
-        self.set_adjacent_diagonal_values(row, col, ".", ".", ".", ".")
-        if boat_type in ("t", "r", "b", "l"):
-            d_row, d_col, _ = orientation_vecs[boat_type]
-            self.set_value(row + d_row, col + d_col, "x")
-            self.set_adjacent_touching_values(row, col, ".", ".", ".", ".")
-        elif boat_type == "c":
-            self.set_adjacent_touching_values(row, col, ".", ".", ".", ".")
-        elif boat_type == "m":
-            touching_adjacents = self.get_adjacent_touching_values(row, col)
-            if touching_adjacents.count("?") == 4:
+        self.set_adjacent_diagonal_values(idx, WATER)
+        if boat_type in (TOP, RIGHT, BOTTOM, LEFT):
+            self.set_code(idx + self.puzzle.piece_offsets[boat_type][0], BOAT)
+            self.set_adjacent_touching_values(idx, WATER, WATER, WATER, WATER)
+        elif boat_type == CENTER:
+            self.set_adjacent_touching_values(idx, WATER, WATER, WATER, WATER)
+        elif boat_type == MIDDLE:
+            touching_adjacents = self.get_adjacent_touching_values(idx)
+            if touching_adjacents.count(UNKNOWN) == 4:
                 return
             for i, touching_adjacent in enumerate(touching_adjacents):
-                if touching_adjacent != "?":
+                if touching_adjacent != UNKNOWN:
                     break
-            if (touching_adjacent in boat_piece_vals and (i == 0 or i == 2)) or (
-                touching_adjacent in water_vals and (i == 1 or i == 3)
+            if (touching_adjacent >= BOAT and (i == 0 or i == 2)) or (
+                touching_adjacent == WATER and (i == 1 or i == 3)
             ):
-                self.set_adjacent_touching_values(row, col, "x", ".", "x", ".")
-            elif (touching_adjacent in boat_piece_vals and (i == 1 or i == 3)) or (
-                touching_adjacent in water_vals and (i == 0 or i == 2)
+                self.set_adjacent_touching_values(idx, BOAT, WATER, BOAT, WATER)
+            elif (touching_adjacent >= BOAT and (i == 1 or i == 3)) or (
+                touching_adjacent == WATER and (i == 0 or i == 2)
             ):
-                self.set_adjacent_touching_values(row, col, ".", "x", ".", "x")
+                self.set_adjacent_touching_values(idx, WATER, BOAT, WATER, BOAT)
 
-    def find_boat_piece(self, row: int, col: int):
+    def find_boat_piece(self, idx: int):
         """Checks if it can infer the boat piece type. If so, it finds
         what the 'x' piece represents."""
-        if "?" in self.get_adjacent_touching_values(row, col):
+        if UNKNOWN in self.get_adjacent_touching_values(idx):
             return
 
-        for boat_piece_val in boat_piece_vals:
-            if self.check_boat_piece_isolation(row, col, boat_piece_val):
+        for boat_piece in (TOP, BOTTOM, LEFT, RIGHT, CENTER, MIDDLE, BOAT):
+            if self.check_boat_piece_isolation(idx, boat_piece):
                 break
 
-        self.set_value(row, col, boat_piece_val, True)
-        self.check_boat_completion(row, col)
+        self.set_code(idx, boat_piece, True)
+        self.check_boat_completion(idx)
 
-    def is_placement_valid(self, row: int, col: int, size: int, orientation: str):
+    def is_placement_valid(
+        self, row: int, col: int, size: int, orientation: str, placed=False
+    ):
         """Checks if a placement is valid. It has to add a boat in a position
         such that it won't touch another boat diagonally, vertically or
         horizontally. It also has to respect the column and row constraints
-        and have compatible hints in its positions."""
-        d_row, d_col, o_extreme = orientation_vecs[orientation]
-        i_row, i_col = row, col
-        count = 0
-        for _ in range(size):
-            val = self.get_value(i_row, i_col)
-            if val != "x" and val in boat_piece_vals:
-                count += 1
-            i_row += d_row
-            i_col += d_col
-        if count == size:
+        and have compatible hints in its positions. With the placed flag, a
+        boat that is already on the board is valid too."""
+        ship, halo = get_boat_masks(self.size, row, col, size, orientation)
+        if ship & self.water_mask or halo & self.boat_mask:
             return False
+        known = ship & self.pieces_mask
+        if not known:
+            return True
+        if known == ship and not placed:
+            return False  # the boat is already on the board
 
+        orientation = cell_codes[orientation]
+        offset, _, o_extreme = self.puzzle.piece_offsets[orientation]
+        idx = self.get_index(row, col)
         for i in range(size):
-            val = self.get_value(row, col)
-            if i == 0 and val not in ("?", "x", orientation):
-                return False
-            elif i == size - 1 and val not in ("?", "x", o_extreme):
+            val = self.cells[idx]
+            if i == 0 and val not in (UNKNOWN, BOAT, orientation):
                 return False
-            elif i != 0 and i != size - 1 and val not in ("?", "x", "m"):
-                return False
-            if i == 0 and not self.check_boat_piece_isolation(row, col, orientation):
-                return False
-            elif i == size - 1 and not self.check_boat_piece_isolation(
-                row, col, o_extreme
-            ):
+            elif i == size - 1 and val not in (UNKNOWN, BOAT, o_extreme):
                 return False
-            elif (
-                i != 0
-                and i != size - 1
-                and not self.check_boat_piece_isolation(row, col, "m")
-            ):
+            elif i != 0 and i != size - 1 and val not in (UNKNOWN, BOAT, MIDDLE):
                 return False
-            row += d_row
-            col += d_col
+            idx += offset
 
         return True
 
+    def update_live_placements(self):
+        """Drops the live placements that stopped being valid because of the
+        cells changed since the last update. Water in the boat of a placement
+        or a boat piece in its halo rule it out right away, while a known
+        piece in its boat means the placement of the boats that are still to
+        be placed has to be checked again."""
+        if not self.dirty_mask:
+            return
+        puzzle, cells = self.puzzle, self.cells
+        invalid = suspects = 0
+        for idx in bit_indices(self.dirty_mask):
+            code = cells[idx]
+            if code == WATER:
+                invalid |= puzzle.ship_watches[idx]
+            elif code >= BOAT:
+                invalid |= puzzle.halo_watches[idx]
+                if code != BOAT:
+                    suspects |= puzzle.ship_watches[idx]
+        sizes = 0
+        for size, num in enumerate(self.boats_num):
+            if num > 0:
+                sizes |= puzzle.placement_masks[size]
+        for pid in bit_indices(suspects & sizes & self.live_mask & ~invalid):
+            if not self.is_placement_valid(*puzzle.placements[pid]):
+                invalid |= 1 << pid
+        if self.trail is not None:
+            self.trail.append(("live", self.live_mask, self.dirty_mask))
+        self.live_mask &= ~invalid
+        self.dirty_mask = 0
+
     def get_placements_for_boat(self, size: int):
         """Gets all the valid placements (in both orientations) for a boat of
-        a certain size."""
-        placements = ()
-        for diag in range(self.size):
-            orientation = "c"
-            if size != 1:
-                orientation = "l"
-            if rows_fixed_num[diag] >= size:
-                for col in range(self.size - size + 1):
-                    if self.is_placement_valid(diag, col, size, orientation):
-                        placements += ((diag, col, size, orientation),)
-
-            if size != 1:
-                orientation = "t"
-            if cols_fixed_num[diag] >= size:
-                for row in range(self.size - size + 1):
-                    if self.is_placement_valid(row, diag, size, orientation):
-                        placements += ((row, diag, size, orientation),)
+        a certain size, from the live placements of the board."""
+        self.update_live_placements()
+        placements = self.puzzle.placements
+        live = self.live_mask & self.puzzle.placement_masks[size]
+        return tuple(placements[pid] for pid in bit_indices(live))
 
-        return placements
+    def exclude_placements(self, mask: int):
+        """Drops the placements of the given mask from the live ones, so they
+        are never tried on this board again."""
+        if self.trail is not None:
+            self.trail.append(("live", self.live_mask, self.dirty_mask))
+        self.live_mask &= ~mask
+
+    def get_largest_boat_placements(self):
+        """Gets the placements of the largest boat that is still to be
+        placed."""
+        for size in reversed(range(1, len(self.boats_num))):
+            if self.boats_num[size] != 0:
+                return self.get_placements_for_boat(size)
+        return ()
+
+    def get_most_constrained_placements(self):
+        """Gets the placements of the most constrained choice, i.e., the one
+        with the fewest placements, like the minimum remaining values
+        heuristic. The choices are the boat sizes still to be placed, whose
+        placements are the ones of one of its boats, and the cells of the
+        rows and columns known to have a boat piece that isn't part of a
+        known boat yet ('x' cells), whose placements are the ones covering
+        them, since one of those has to be taken by a boat. Ties are broken
+        by the slack of the choice, i.e., how many more placements it has
+        than the boats it needs, and then by the larger boat size. A choice
+        without placements leads to no solution."""
+        self.update_live_placements()
+        puzzle = self.puzzle
+        distinct = self.live_mask & puzzle.distinct_mask
+        best_key, best = None, 0
+        remaining = 0
+        for size in reversed(range(1, len(self.boats_num))):
+            num = self.boats_num[size]
+            if num <= 0:
+                continue
+            placements = distinct & puzzle.placement_masks[size]
+            remaining |= placements
+            total = placements.bit_count()
+            if best_key is None or (total, total - num) < best_key:
+                best_key, best = (total, total - num), placements
+        if best_key is None:
+            return ()
+
+        for idx in bit_indices(self.boat_mask & ~self.pieces_mask):
+            placements = puzzle.ship_watches[idx] & remaining
+            total = placements.bit_count()
+            if (total, total - 1) < best_key:
+                best_key, best = (total, total - 1), placements
+
+        return tuple(puzzle.placements[pid] for pid in bit_indices(best))
+
+    def get_remaining_placements(self):
+        """Returns the mask of the live placements of the boats that are
+        still to be placed, with each submarine placement counted once."""
+        remaining = 0
+        for size, num in enumerate(self.boats_num):
+            if num > 0:
+                remaining |= self.puzzle.placement_masks[size]
+        return remaining & self.live_mask & self.puzzle.distinct_mask
+
+    def is_exhausted(self, excluded: int):
+        """Checks if the board can't lead to a solution without the
+        placements of the given mask: it is invalid, or some boat size still
+        to be placed or some boat piece of unknown type ('x' cell) has all of
+        its live placements in the mask. Like for the most constrained
+        choice, one of those placements would have to be taken."""
+        if self.is_invalid or any(num < 0 for num in self.boats_num):
+            return True
+        self.update_live_placements()
+        puzzle, remaining = self.puzzle, 0
+        for size, num in enumerate(self.boats_num):
+            if num > 0:
+                placements = self.live_mask & puzzle.placement_masks[size]
+                if not placements & ~excluded:
+                    return True
+                remaining |= placements
+        for idx in bit_indices(self.boat_mask & ~self.pieces_mask):
+            if not puzzle.ship_watches[idx] & remaining & ~excluded:
+                return True
+        return False
+
+    def sort_least_constraining(self, placements):
+        """Sorts the placements by how many of the remaining placements each
+        one rules out, the one that rules out the fewest first."""
+        puzzle = self.puzzle
+        conflicts = get_placement_conflicts(self.size, len(puzzle.fleet) - 1)
+        remaining = self.get_remaining_placements()
+        return sorted(
+            placements,
+            key=lambda action: (
+                conflicts[puzzle.placement_ids[action]] & remaining
+            ).bit_count(),
+        )
+
+    def sort_known_first(self, placements):
+        """Sorts the placements by how many cells of their boat are already
+        known to have a boat piece, the one that covers the most first."""
+        return sorted(
+            placements,
+            key=lambda action: -(
+                get_boat_masks(self.size, *action)[0] & self.boat_mask
+            ).bit_count(),
+        )
+
+    def sort_saturating_first(self, placements):
+        """Sorts the placements by how many rows and columns each one fills
+        up, i.e., completes their count of boat pieces, the one that fills up
+        the most first."""
+        lines_fixed_num = self.puzzle.lines_fixed_num
+
+        def count_saturated_lines(action):
+            ship = get_boat_masks(self.size, *action)[0]
+            new_pieces_num = {}
+            for idx in bit_indices(ship & self.unknown_mask):
+                row, col = divmod(idx, self.stride)
+                for line in (row - 1, self.size + col - 1):
+                    new_pieces_num[line] = new_pieces_num.get(line, 0) + 1
+            return sum(
+                num == lines_fixed_num[line] - self.boat_pieces_num[line]
+                for line, num in new_pieces_num.items()
+            )
+
+        return sorted(placements, key=lambda action: -count_saturated_lines(action))
 
     def place_boat(self, row: int, col: int, size: int, orientation: str):
         """Returns a new board that results from placing the given boat in the
         valid position. In order to be valid the is_placement_valid function
         must return True for the given placement/position."""
-        new_cells = [[val for val in self.cells[row]] for row in range(self.size)]
-        new_board = Board(new_cells)
-
-        new_board.rows_boat_pieces_num = self.rows_boat_pieces_num.copy()
-        new_board.cols_boat_pieces_num = self.cols_boat_pieces_num.copy()
-        new_board.rows_water_num = self.rows_water_num.copy()
-        new_board.cols_water_num = self.cols_water_num.copy()
-        new_board.boats_num = self.boats_num.copy()
-        new_board.boats_num[size] -= 1
-        d_row, d_col, o_extreme = orientation_vecs[orientation]
+        return self.copy().put_boat(row, col, size, orientation)
+
+    def put_boat(self, row: int, col: int, size: int, orientation: str):
+        """Places the given boat on this board, changing it in place, and
+        returns it. The placement must be valid, as in place_boat."""
+        unknown = self.unknown_mask
+        self.add_boat(row, col, size, orientation)
+        return self.reduce_board(unknown & ~self.unknown_mask).forward_check()
+
+    def add_boat(self, row: int, col: int, size: int, orientation: str):
+        """Adds the pieces of the given boat to the board, isolating them,
+        without inferring anything else from them."""
+        self.remove_boat(size)
+        orientation = cell_codes[orientation]
+        offset, _, o_extreme = self.puzzle.piece_offsets[orientation]
+        idx = self.get_index(row, col)
         for i in range(size):
             if i == 0:
                 boat_type = orientation
             elif i == size - 1:
                 boat_type = o_extreme
             else:
-                boat_type = "m"
-            if new_board.get_value(row, col) == "?":
-                new_board.set_value(row, col, boat_type)
-            elif new_board.get_value(row, col) == "x":
-                new_board.set_value(row, col, boat_type, True)
-            new_board.isolate_boat_piece(row, col, boat_type)
-            row += d_row
-            col += d_col
+                boat_type = MIDDLE
+            if self.cells[idx] == UNKNOWN:
+                self.set_code(idx, boat_type)
+            elif self.cells[idx] == BOAT:
+                self.set_code(idx, boat_type, True)
+            self.isolate_boat_piece(idx, boat_type)
+            idx += offset
 
-        return new_board.reduce_board()
+    def forward_check(self):
+        """Checks if every boat size still to be placed has enough live
+        placements for its boats, making the board invalid if not: at least
+        as many placements as boats and enough cells covered by them for the
+        boats not to overlap. When a size has exactly as many placements as
+        boats, they are all part of any solution, so they are placed right
+        away, and unknown cells no placement covers are filled with water.
+        Returns the board."""
+        puzzle = self.puzzle
+        while not self.is_invalid:
+            self.update_live_placements()
+            live = self.live_mask & puzzle.distinct_mask
+            forced = all_covered = 0
+            for size in range(1, len(self.boats_num)):
+                num = self.boats_num[size]
+                if num <= 0:
+                    continue
+                placements = live & puzzle.placement_masks[size]
+                total = placements.bit_count()
+                covered = 0
+                for pid in bit_indices(placements):
+                    covered |= puzzle.ship_masks[pid]
+                if total < num or covered.bit_count() < num * size:
+                    self.invalidate()
+                    return self
+                if total == num and not forced:
+                    forced = placements
+                all_covered |= covered
+            if self.boat_mask & ~self.pieces_mask & ~all_covered:
+                self.invalidate()  # a boat piece no boat can cover
+                return self
+            uncovered = self.unknown_mask & ~all_covered
+            if not forced and not uncovered:
+                return self
+            unknown = self.unknown_mask
+
+            for idx in bit_indices(uncovered):
+                self.set_code(idx, WATER)
+
+            for pid in bit_indices(forced):
+                if not self.is_placement_valid(*puzzle.placements[pid]):
+                    self.invalidate()  # the forced boats rule each other out
+                    return self
+                self.add_boat(*puzzle.placements[pid])
+            self.reduce_board(unknown & ~self.unknown_mask)
+        return self
+
+    def fill(self, boats):
+        """Returns a copy of the board with the given boats, the ones of a
+        solution found by other means than the search, and water in every
+        other unknown cell. The boats already on the board are skipped."""
+        board = self.copy()
+        ship_masks, placement_ids = self.puzzle.ship_masks, self.puzzle.placement_ids
+        for action in boats:
+            if ship_masks[placement_ids[action]] & ~board.pieces_mask:
+                board.add_boat(*action)
+        for idx in bit_indices(board.unknown_mask):
+            board.set_code(idx, WATER)
+        return board
+
+    def copy(self):
+        """Returns a copy of the board that can be changed independently.
+        Copying the flat cells is a single allocation, whatever the size."""
+        new_board = Board.__new__(Board)
+        new_board.size = self.size
+        new_board.stride = self.stride
+        new_board.cells = self.cells[:]
+        new_board.puzzle = self.puzzle
+        new_board.is_invalid = self.is_invalid
+        new_board.trail = None
+        new_board.boat_mask = self.boat_mask
+        new_board.water_mask = self.water_mask
+        new_board.pieces_mask = self.pieces_mask
+        new_board.unknown_mask = self.unknown_mask
+        new_board.live_mask = self.live_mask
+        new_board.dirty_mask = self.dirty_mask
+        new_board.boat_pieces_num = self.boat_pieces_num[:]
+        new_board.water_num = self.water_num[:]
+        new_board.boats_num = self.boats_num[:]
+        new_board.hash = self.hash
+        return new_board
+
+    def encode(self):
+        """Returns the board packed into bytes: its cells, its boats left and
+        its live and dirty masks, in the sizes given by the record sizes of
+        its puzzle, so every board of a puzzle packs into as many bytes. The
+        rest of the board follows from those, so decode can rebuild it, e.g.,
+        in another process. Invalid boards can't be packed."""
+        _, _, live_size, dirty_size = self.puzzle.get_record_sizes()
+        return b"".join(
+            (
+                self.cells,
+                self.boats_num.tobytes(),
+                self.live_mask.to_bytes(live_size, "little"),
+                self.dirty_mask.to_bytes(dirty_size, "little"),
+            )
+        )
+
+    @staticmethod
+    def decode(puzzle: Puzzle, data):
+        """Returns the board of the puzzle packed into the given bytes by
+        encode. The masks, the counters and the hash are rebuilt from the
+        cells and the boats left."""
+        cells_size, boats_size, live_size, _ = puzzle.get_record_sizes()
+        board = Board(puzzle)
+        for idx in bit_indices(board.unknown_mask):
+            code = data[idx]
+            if code == UNKNOWN:
+                continue
+            board.write_cell(idx, code)
+            row, col = divmod(idx, board.stride)
+            counters = board.water_num if code == WATER else board.boat_pieces_num
+            counters[row - 1] += 1
+            counters[board.size + col - 1] += 1
+        start = cells_size + boats_size
+        board.boats_num = array("h", data[cells_size:start])
+        for size, num in enumerate(board.boats_num):
+            board.hash -= (puzzle.fleet[size] - num) * puzzle.boat_keys[size]
+        board.live_mask = int.from_bytes(data[start : start + live_size], "little")
+        board.dirty_mask = int.from_bytes(data[start + live_size :], "little")
+        return board
 
     def is_board_complete(self):
         """Checks if the board is a valid solution to the puzzle. For a
         Bimaru puzzle to be complete it needs to have all the constraints in
         the columns and rows satisfied and be a valid board."""
         if any(num < 0 for num in self.boats_num):
-            self.is_invalid = True
+            self.invalidate()
         if self.is_invalid or sum(self.boats_num) != 0:
             return False
 
@@ -421,20 +1253,44 @@ class Board:
 
     def __repr__(self):
         """External representation of a Bimaru board that follows the specified
-        format."""
-        return "\n".join(map(lambda val: "".join(val), self.cells))
+        format. Hints are shown in uppercase."""
+        lines, hints_mask = [], self.puzzle.hints_mask
+        for row in range(self.size):
+            start, line = self.get_index(row, 0), ""
+            for idx in range(start, start + self.size):
+                vals = hint_vals if hints_mask >> idx & 1 else cell_vals
+                line += vals[self.cells[idx]]
+            lines.append(line)
+        return "\n".join(lines)
+
+
+branchings = {
+    "largest": Board.get_largest_boat_placements,
+    "mrv": Board.get_most_constrained_placements,
+}
+
+
+# Orderings of the placements, the ones to try first at the start
+orderings = {
+    "scan": None,
+    "lcv": Board.sort_least_constraining,
+    "known": Board.sort_known_first,
+    "saturate": Board.sort_saturating_first,
+}
 
 
 class BimaruState:
     """Represents the state used in the search algorithms."""
 
-    state_id = 0
+    __slots__ = ("board", "id", "exclusions")
+    state_ids = count()
 
     def __init__(self, board: Board):
-        """Each state has a board and a unique identifier."""
+        """Each state has a board and a unique identifier. Once its actions
+        are known, it also has the placements each action excludes."""
         self.board = board
-        self.id = BimaruState.state_id
-        BimaruState.state_id += 1
+        self.id = next(BimaruState.state_ids)
+        self.exclusions = None
 
     def __lt__(self, other):
         """This method is used in case of a tie in the management of the
@@ -445,10 +1301,26 @@ class BimaruState:
 class Bimaru(Problem):
     """Implements the Problem superclass to solve the bimaru problem."""
 
-    def __init__(self, board: Board):
-        """The constructor specifies the initial state."""
+    def __init__(
+        self, board: Board, branching="largest", ordering="scan", symmetry=True
+    ):
+        """The constructor specifies the initial state, the branching
+        policy, i.e., which placements are tried from each state: the ones
+        of the largest boat left ("largest") or the ones of the most
+        constrained boat size or boat piece ("mrv"), and the order in which
+        they are tried: the scan order of the board ("scan"), the least
+        constraining ones first ("lcv"), the ones covering known boat pieces
+        first ("known") or the ones filling up rows and columns first
+        ("saturate"). With symmetry breaking, the children of a state never
+        try again the placements its earlier children tried, which would only
+        lead to solutions already found (or not) by them. So boats of the same
+        size are always placed in the same order, instead of in every order,
+        without losing any solution."""
         state = BimaruState(board)
         super().__init__(state)
+        self.branch = branchings[branching]
+        self.order = orderings[ordering]
+        self.symmetry = symmetry
 
     def actions(self, state: BimaruState):
         """Returns a list of actions that can be performed from
@@ -456,20 +1328,99 @@ class Bimaru(Problem):
         if state.board.is_invalid or sum(state.board.boats_num) == 0:
             return ()
 
-        for next_size in reversed(range(4 + 1)):
-            if next_size == 0:
-                return ()
-            if state.board.boats_num[next_size] != 0:
-                break
+        placements = self.branch(state.board)
+        if self.order is not None:
+            # The depth-first searches try the last action first
+            placements = tuple(reversed(self.order(state.board, placements)))
+        if self.symmetry:
+            placements = self.break_symmetries(state, placements)
+        return placements
 
-        return state.board.get_placements_for_boat(next_size)
+    def break_symmetries(self, state: BimaruState, placements):
+        """Drops the repeated placements (submarines are found in both
+        orientations), keeping the one that is tried first, and stores in the
+        state the placements each action excludes: the ones tried before it,
+        which are the ones after it, since the depth-first searches try the
+        last action first. Any solution with one of those is found by trying
+        it instead, so excluding them loses no solution."""
+        placement_bits = state.board.puzzle.placement_bits
+        exclusions, tried = {}, 0
+        for action in reversed(placements):
+            if action not in exclusions:
+                exclusions[action] = tried
+                tried |= placement_bits[action]
+        state.exclusions = exclusions
+        return tuple(reversed(exclusions))
 
     def result(self, state: BimaruState, action):
         """Returns the state obtained by executing the 'action' on the
         'state' passed as an argument. The action to execute must be one
         present in the list obtained by executing self.actions(state)."""
         (row, col, size, orientation) = action
-        return BimaruState(state.board.place_boat(row, col, size, orientation))
+        board = state.board.copy()
+        if state.exclusions is not None:
+            board.exclude_placements(state.exclusions[action])
+        return BimaruState(board.put_boat(row, col, size, orientation))
+
+    def apply(self, state: BimaruState, action):
+        """Executes the 'action' on the board of the 'state' itself and
+        returns the trail mark and the exclusions of the state that undo
+        it."""
+        mark = state.board.get_trail_mark()
+        if state.exclusions is not None:
+            state.board.exclude_placements(state.exclusions[action])
+        state.board.put_boat(*action)
+        return mark, state.exclusions
+
+    def undo(self, state: BimaruState, token):
+        """Reverts the board of the 'state' to the given trail mark, along
+        with its exclusions."""
+        mark, state.exclusions = token
+        state.board.undo(mark)
+
+    def state_key(self, state: BimaruState):
+        """Returns the key of the state in the transposition tables: the hash
+        of its board and the placements it can still try. Boards with the
+        same cells and boats left can differ in the placements ruled out by
+        the symmetry breaking, so these are part of the key."""
+        board = state.board
+        board.update_live_placements()
+        return board.hash, board.get_remaining_placements(), board.is_invalid
+
+    def explain(self, actions, conflict, tried):
+        """Returns the placements that make the board of the given ones a
+        dead end. Starting from the conflict, the other placements are put
+        again on the starting board, from the first one to the last, until
+        it is exhausted by the tried placements (the ones the conflict rules
+        out), i.e., until they were the only options left for one of its
+        choices. Without a conflict, the last placement goes first, since the
+        board before it wasn't a dead end. Placements whose boat is already
+        on the board, having been inferred from the ones before, are left
+        out. Needs the symmetry breaking to be off, since the placements it
+        excludes are not tried."""
+        puzzle = self.initial.board.puzzle
+        excluded = 0
+        for action in tried:
+            excluded |= puzzle.placement_bits[action]
+        board = self.initial.board.copy()
+        nogood = [action for action in actions if action in conflict]
+        candidates = [action for action in actions if action not in conflict]
+        for action in nogood:
+            excluded |= puzzle.placement_bits[action]
+            if puzzle.ship_masks[puzzle.placement_ids[action]] & ~board.pieces_mask:
+                board.put_boat(*action)
+        candidates.reverse()
+        if not nogood and candidates:
+            candidates.append(candidates.pop(0))
+        while not board.is_exhausted(excluded):
+            if not candidates:
+                return list(actions)
+            action = candidates.pop()
+            if puzzle.ship_masks[puzzle.placement_ids[action]] & ~board.pieces_mask:
+                nogood.append(action)
+                excluded |= puzzle.placement_bits[action]
+                board.put_boat(*action)
+        return nogood
 
     def goal_test(self, state: BimaruState):
         """Returns True if and only if the state passed as an argument is
@@ -481,16 +1432,745 @@ class Bimaru(Problem):
         """Heuristic function used for informed searches."""
         brd, row_diff = node.state.board, 0
         for i in range(node.state.board.size):
-            row_diff += rows_fixed_num[i] - brd.rows_boat_pieces_num[i]
+            row_diff += brd.puzzle.rows_fixed_num[i] - brd.boat_pieces_num[i]
         return row_diff
 
 
+def get_exact_cover(board: Board):
+    """Returns the exact cover problem of the puzzle of the board, along with
+    the placement of each of its options (None for the water ones). Every
+    cell is a primary item, covered by a boat or by water, and so are the
+    water cells each line must have and the boats of each size. Each cell is
+    also a secondary item, colored boat by the boats on it and water by the
+    ones around it, so no two boats touch. The options are the placements
+    the board didn't rule out, including the boats already on it, and the
+    water of every cell that isn't known to be a boat piece. The boat sizes
+    are branched on first, from the largest one."""
+    from dlx import DancingLinks
+
+    board.update_live_placements()
+    puzzle, size = board.puzzle, board.size
+    cells = [idx for line in puzzle.line_masks[:size] for idx in bit_indices(line)]
+    primary = dict.fromkeys(cells, 1)
+    for line, fixed_num in enumerate(puzzle.lines_fixed_num):
+        primary["water", line] = size - fixed_num
+    for boat_size, num in enumerate(puzzle.fleet[1:], 1):
+        primary["fleet", boat_size] = num
+    # Like the largest branching policy, the boats are placed from the largest
+    longest = len(puzzle.fleet) - 1
+    preferred = [("fleet", boat_size) for boat_size in range(longest, 0, -1)]
+    links = DancingLinks(primary, [("halo", idx) for idx in cells], preferred)
+    placed = sum(
+        1 << pid
+        for pid in bit_indices(puzzle.distinct_mask)
+        if not puzzle.ship_masks[pid] & ~board.pieces_mask
+    )
+    placements = []
+    for pid in bit_indices((board.live_mask | placed) & puzzle.distinct_mask):
+        action = puzzle.placements[pid]
+        if not board.is_placement_valid(*action, placed=True):
+            continue
+        ship, halo = get_boat_masks(size, *action)
+        items, colors = [("fleet", action[2])], {}
+        for idx in bit_indices(ship):
+            items += [idx, ("halo", idx)]
+            colors["halo", idx] = "boat"
+        for idx in bit_indices(halo):
+            if idx in primary:
+                items.append(("halo", idx))
+                colors["halo", idx] = "water"
+        links.add_option(items, colors)
+        placements.append(action)
+    for idx in bit_indices(board.unknown_mask | board.water_mask):
+        if idx in primary:
+            row, col = divmod(idx, board.stride)
+            links.add_option([idx, ("water", row - 1), ("water", size + col - 1)])
+            placements.append(None)
+    return links, placements
+
+
+def dancing_links_search(problem: Bimaru):
+    """Solves the puzzle of the problem as an exact cover problem, with
+    dancing links, instead of searching its states. Returns a node with the
+    solved board, or None if the puzzle has no solution. A problem with a
+    deadline (like the ones of the server) stops it there, with a
+    TimeoutError."""
+    board = problem.initial.board
+    if board.is_invalid or any(
+        fixed_num > board.size for fixed_num in board.puzzle.lines_fixed_num
+    ):
+        return None
+    links, placements = get_exact_cover(board)
+    links.deadline = getattr(problem, "deadline", None)
+    solution = next(links.solve(), None)
+    if solution is None:
+        return None
+    boats = [placements[number] for number in solution if placements[number]]
+    return Node(BimaruState(board.fill(boats)))
+
+
+def get_cnf(board: Board):
+    """Returns a SAT solver loaded with the clauses of the puzzle of the
+    board, along with the placement of each placement variable. There is a
+    variable for each cell, true if it has a boat piece, and one for each
+    placement the board didn't rule out (including the boats already on it),
+    true if its boat is in the solution. A cell has a boat piece if and only
+    if some boat takes it, a boat rules out the boat pieces in its halo, so
+    no two boats overlap or touch, and sequential counters give every line
+    its count of boat pieces and the fleet its boats. The cells already known
+    are unit clauses."""
+    from sat import Solver, add_exactly
+
+    board.update_live_placements()
+    puzzle, solver = board.puzzle, Solver()
+    cells = {}
+    for line in puzzle.line_masks[: board.size]:
+        for idx in bit_indices(line):
+            cells[idx] = solver.new_var()
+            if board.water_mask >> idx & 1:
+                solver.add_clause([-cells[idx]])
+            elif board.boat_mask >> idx & 1:
+                solver.add_clause([cells[idx]])
+
+    placed = sum(
+        1 << pid
+        for pid in bit_indices(puzzle.distinct_mask)
+        if not puzzle.ship_masks[pid] & ~board.pieces_mask
+    )
+    placements, covers, fleet = {}, {idx: [] for idx in cells}, {}
+    for pid in bit_indices((board.live_mask | placed) & puzzle.distinct_mask):
+        action = puzzle.placements[pid]
+        if not board.is_placement_valid(*action, placed=True):
+            continue
+        var = solver.new_var()
+        placements[var] = action
+        fleet.setdefault(action[2], []).append(var)
+        ship, halo = get_boat_masks(board.size, *action)
+        for idx in bit_indices(ship):
+            solver.add_clause([-var, cells[idx]])
+            covers[idx].append(var)
+        for idx in bit_indices(halo):
+            if idx in cells:
+                solver.add_clause([-var, -cells[idx]])
+    for idx, var in cells.items():
+        solver.add_clause([-var] + covers[idx])
+
+    for line, line_mask in enumerate(puzzle.line_masks):
+        line_cells = [cells[idx] for idx in bit_indices(line_mask)]
+        add_exactly(solver, line_cells, puzzle.lines_fixed_num[line])
+    for size, num in enumerate(puzzle.fleet[1:], 1):
+        add_exactly(solver, fleet.get(size, ()), num)
+    return solver, placements
+
+
+def sat_search(problem: Bimaru):
+    """Solves the puzzle of the problem with the CDCL SAT solver, instead of
+    searching its states. Returns a node with the solved board, or None if
+    the puzzle has no solution. A problem with a deadline (like the ones of
+    the server) stops it there, with a TimeoutError."""
+    board = problem.initial.board
+    if board.is_invalid:
+        return None
+    solver, placements = get_cnf(board)
+    solver.deadline = getattr(problem, "deadline", None)
+    if not solver.solve():
+        return None
+    boats = [action for var, action in placements.items() if solver.model[var]]
+    return Node(BimaruState(board.fill(boats)))
+
+
+def count_solutions(board: Board, limit=None):
+    """Returns the number of solutions of the puzzle of the board, counting
+    up to the given limit, if any. Each solution found is blocked with a
+    clause ruling out its boats, so the solver finds another one. With a
+    limit of 2, it checks if the puzzle has a unique solution."""
+    if board.is_invalid:
+        return 0
+    solver, placements = get_cnf(board)
+    solutions = 0
+    while (limit is None or solutions < limit) and solver.solve():
+        solutions += 1
+        solver.add_clause([-var for var in placements if solver.model[var]])
+    return solutions
+
+
+searchers = {
+    "dfs": depth_first_tree_search,
+    "lazy": depth_first_lazy_search,
+    "backtracking": depth_first_backtracking_search,
+    "backjumping": depth_first_backjumping_search,
+    "bfs": breadth_first_tree_search,
+    "greedy": greedy_search,
+    "astar": astar_search,
+    "rbfs": recursive_best_first_search,
+    "dlx": dancing_links_search,
+    "sat": sat_search,
+}
+
+
+# Strategies raced by the portfolio when none are given
+portfolio = ("lazy", "lazy:mrv", "backjumping", "greedy", "dlx", "sat")
+
+
+def get_puzzle(rows, cols, hints=(), fleet=(0, 4, 3, 2, 1)):
+    """Returns the puzzle with the given row and column counts, which can be
+    sequences of integers or the ROW and COLUMN lines of the input format,
+    hints, which can be (row, column, value) tuples or HINT lines, and
+    fleet, which can be a FLEET line or the number of boats of each size,
+    indexed by size."""
+    if isinstance(rows, str):
+        rows = parse_counts(rows)
+    if isinstance(cols, str):
+        cols = parse_counts(cols)
+    if isinstance(fleet, str):
+        fleet = parse_fleet(fleet)
+    hints = [parse_hint(hint) if isinstance(hint, str) else hint for hint in hints]
+    return Puzzle(rows, cols, hints, fleet)
+
+
+def solve(
+    rows,
+    cols,
+    hints=(),
+    search="lazy",
+    fleet=(0, 4, 3, 2, 1),
+    branching="largest",
+    ordering="scan",
+    table_size=0,
+):
+    """Solves a puzzle without going through stdin and returns the solved
+    board, or None if the puzzle has no solution. Every puzzle has its own
+    context, so many of them can be solved in the same process, even at the
+    same time. The counts, hints and fleet are given as to get_puzzle. The
+    search, branching and ordering are the names of the ones of the command
+    line options, and with a table size the search keeps a transposition
+    table of that many dead ends (only the lazy and backtracking searches
+    can)."""
+    board = Board.from_puzzle(get_puzzle(rows, cols, hints, fleet))
+    # Backjumping learns nogoods, which already rule out what the symmetry
+    # breaking would
+    bimaru = Bimaru(board, branching, ordering, search != "backjumping")
+    if table_size:
+        goal_node = searchers[search](bimaru, TranspositionTable(table_size))
+    else:
+        goal_node = searchers[search](bimaru)
+    return goal_node.state.board if goal_node else None
+
+
+def parse_strategy(strategy: str):
+    """Returns the search, branching and ordering of a strategy of the
+    portfolio, given as 'search[:branching[:ordering]]' (e.g., 'lazy:mrv'),
+    with the defaults of the command line options for the ones left out."""
+    names = strategy.split(":")
+    search, branching, ordering = names + ["lazy", "largest", "scan"][len(names) :]
+    if len(names) > 3 or search not in searchers:
+        raise ValueError(f"invalid strategy: {strategy!r}")
+    if branching not in branchings or ordering not in orderings:
+        raise ValueError(f"invalid strategy: {strategy!r}")
+    return search, branching, ordering
+
+
+def run_strategy(puzzle: Puzzle, strategy: str, results):
+    """Solves the puzzle with the strategy, in a process of the portfolio,
+    and puts the strategy and the solved board (None if the puzzle has no
+    solution) in the queue of results."""
+    search, branching, ordering = parse_strategy(strategy)
+    board = Board.from_puzzle(puzzle)
+    goal_node = searchers[search](
+        Bimaru(board, branching, ordering, search != "backjumping")
+    )
+    results.put((strategy, goal_node.state.board.copy() if goal_node else None))
+
+
+def solve_portfolio(puzzle: Puzzle, strategies=portfolio, timeout=None):
+    """Races the strategies (see parse_strategy) on the puzzle, each one in
+    its own process, and returns the board of the first one to finish, or
+    None if the puzzle has no solution, along with that strategy. The other
+    processes are terminated right away. No strategy wins on every puzzle,
+    so the time taken is the one of the best strategy for the puzzle, plus
+    the start of the processes. If no strategy finishes within the timeout
+    (in seconds), or every one fails, e.g., by running out of memory, the
+    winner is None too."""
+    from multiprocessing import Process, Queue
+    from queue import Empty
+
+    for strategy in strategies:
+        parse_strategy(strategy)
+    results = Queue()
+    processes = [
+        Process(target=run_strategy, args=(puzzle, strategy, results), daemon=True)
+        for strategy in strategies
+    ]
+    start = perf_counter()
+    for process in processes:
+        process.start()
+    try:
+        while timeout is None or perf_counter() - start < timeout:
+            # Checked before waiting, as a process only exits after its
+            # result made it to the queue
+            alive = any(process.is_alive() for process in processes)
+            try:
+                strategy, board = results.get(timeout=0.05)
+                return board, strategy
+            except Empty:
+                if not alive:
+                    break
+        return None, None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def split_problem(problem: Bimaru, count: int):
+    """Expands the root of the problem breadth first, with its actions and
+    results, until there are at least the given number of subtrees left to
+    search (or none). Returns a goal node, if one is found on the way, and
+    the nodes at the roots of the subtrees left, in the order the depth
+    first searches would try them. Invalid boards have nothing to search."""
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node, []
+    frontier = deque([node])
+    while frontier and len(frontier) < count:
+        node = frontier.popleft()
+        for child in reversed(node.expand(problem)):
+            if problem.goal_test(child.state):
+                return child, []
+            if not child.state.board.is_invalid:
+                frontier.append(child)
+    return None, list(frontier)
+
+
+def run_subtrees(puzzle: Puzzle, strategy: str, tasks: tuple, results):
+    """Searches the subtrees of a split search, in a process of its pool,
+    until one of them has a solution, which is put in the queue of results,
+    or none are left, when None is put in it instead. The tasks are the name
+    of the shared memory with the packed boards at the roots of the
+    subtrees, the size of each one, their number and the shared counter of
+    the next one to search. Every process takes the next subtree from it
+    when it is done with one, so the ones with the smaller subtrees take
+    more of them."""
+    from multiprocessing.shared_memory import SharedMemory
+
+    search, branching, ordering = parse_strategy(strategy)
+    memory_name, record_size, total, next_task = tasks
+    memory = SharedMemory(name=memory_name)
+    try:
+        while True:
+            with next_task.get_lock():
+                task = next_task.value
+                next_task.value += 1
+            if task >= total:
+                break
+            start = task * record_size
+            board = Board.decode(puzzle, bytes(memory.buf[start : start + record_size]))
+            goal_node = searchers[search](
+                Bimaru(board, branching, ordering, search != "backjumping")
+            )
+            if goal_node:
+                results.put(goal_node.state.board.copy())
+                return
+    finally:
+        memory.close()
+    results.put(None)
+
+
+def solve_split(puzzle: Puzzle, strategy="lazy", workers=0, subtrees=0):
+    """Solves the puzzle with the strategy (see parse_strategy), splitting
+    its search tree among a pool of processes (one per CPU, by default), and
+    returns the solved board, or None if the puzzle has no solution. The
+    root is expanded until there are at least the given number of subtrees
+    (by default, 4 for each process), whose boards are packed into shared
+    memory for the processes to take them one at a time. Once a process
+    finds a solution, the others are terminated."""
+    from multiprocessing import Process, Queue, Value
+    from multiprocessing.shared_memory import SharedMemory
+    from queue import Empty
+
+    workers = workers or cpu_count() or 1
+    search, branching, ordering = parse_strategy(strategy)
+    board = Board.from_puzzle(puzzle)
+    problem = Bimaru(board, branching, ordering, search != "backjumping")
+    goal_node, nodes = split_problem(problem, subtrees or 4 * workers)
+    if goal_node is not None or not nodes:
+        return goal_node.state.board if goal_node else None
+
+    record_size = sum(puzzle.get_record_sizes())
+    memory = SharedMemory(create=True, size=record_size * len(nodes))
+    for task, node in enumerate(nodes):
+        start = task * record_size
+        memory.buf[start : start + record_size] = node.state.board.encode()
+    tasks = (memory.name, record_size, len(nodes), Value("i", 0))
+    results = Queue()
+    processes = [
+        Process(
+            target=run_subtrees, args=(puzzle, strategy, tasks, results), daemon=True
+        )
+        for _ in range(min(workers, len(nodes)))
+    ]
+    for process in processes:
+        process.start()
+    try:
+        finished = 0
+        while finished < len(processes):
+            # Checked before waiting, as a process only exits after its
+            # result made it to the queue
+            alive = any(process.is_alive() for process in processes)
+            try:
+                board = results.get(timeout=0.05)
+            except Empty:
+                if not alive:
+                    raise RuntimeError("a process of the split search failed")
+                continue
+            if board is not None:
+                return board
+            finished += 1
+        return None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        memory.close()
+        memory.unlink()
+
+
+def solve_instance(strategy: str, table_size: int, instance: str):
+    """Solves the instance in the given file with the strategy (see
+    parse_strategy), in a process of the batch pool, and returns its summary:
+    the instance, the strategy, the solved board (None if it has no
+    solution), the time taken, the nodes expanded and generated and, if
+    there is a .out file next to it, whether the board matches it. An
+    instance that can't be read gets an error instead, and matches an empty
+    .out file, which is how instances meant to be rejected are marked."""
+    search, branching, ordering = parse_strategy(strategy)
+    summary = {"instance": instance, "strategy": strategy}
+    expected = path.splitext(instance)[0] + ".out"
+    start = perf_counter()
+    try:
+        with open(instance) as file:
+            board = Board.from_puzzle(Puzzle.parse(file))
+    except StopIteration:
+        summary["error"] = "the instance ends too soon"
+    except (OSError, ValueError) as error:
+        summary["error"] = str(error)
+    if "error" in summary:
+        if path.exists(expected):
+            with open(expected) as file:
+                summary["matches"] = not file.read().strip()
+        return summary
+    problem = InstrumentedProblem(
+        Bimaru(board, branching, ordering, search != "backjumping")
+    )
+    if table_size:
+        goal_node = searchers[search](problem, TranspositionTable(table_size))
+    else:
+        goal_node = searchers[search](problem)
+    summary["board"] = repr(goal_node.state.board) if goal_node else None
+    summary["time"] = round(perf_counter() - start, 6)
+    summary["expanded"], summary["generated"] = problem.succs, problem.states
+    if path.exists(expected):
+        with open(expected) as file:
+            summary["matches"] = summary["board"] == file.read().strip()
+    return summary
+
+
+def solve_batch(instances, strategy="lazy", jobs=1, table_size=0):
+    """Solves the instances (paths to their files) with the strategy in a
+    pool of processes (one per CPU with 0 jobs, none with 1), all in the
+    same interpreter instead of one for each instance, and yields the
+    summary of each one (see solve_instance) as soon as it is solved."""
+    parse_strategy(strategy)
+    task = partial(solve_instance, strategy, table_size)
+    jobs = jobs or cpu_count() or 1
+    if jobs == 1:
+        yield from map(task, instances)
+        return
+    from multiprocessing import Pool
+
+    with Pool(jobs) as pool:
+        yield from pool.imap_unordered(task, instances)
+
+
+def find_instances(pattern: str):
+    """Returns the instance files in the given directory or matching the
+    given glob pattern, sorted."""
+    from glob import glob
+
+    if path.isdir(pattern):
+        pattern = path.join(pattern, "*.txt")
+    return sorted(glob(pattern))
+
+
+class SolutionCache:
+    """Solutions of the puzzles solved before, kept in an SQLite database so
+    that they last across runs and can be shared by processes. They are
+    keyed by the fingerprint of their puzzle and kept in the form of its
+    canonical symmetry, so a rotated or reflected copy of a puzzle gets the
+    solution turned back into its own. It keeps at most maxsize solutions,
+    evicting the least recently used ones when it is full (a sixteenth of
+    them at once, so it isn't full again right away), and counts its
+    hits, misses and evictions. Puzzles without a solution aren't kept. It
+    can be used from a thread other than the one that opened it, as long as
+    a single one uses it at a time."""
+
+    def __init__(self, filename: str, maxsize=100000):
+        import sqlite3
+
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self.db = sqlite3.connect(
+            filename, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS solutions "
+            "(fingerprint TEXT PRIMARY KEY, solution TEXT NOT NULL, used INTEGER)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)")
+        # An upper bound of the number of solutions, as far as this process
+        # knows, so they are only counted when the cache may be full
+        self.size = len(self)
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM solutions").fetchone()[0]
+
+    def get(self, puzzle: Puzzle):
+        """Returns the solution of the puzzle, as printed, or None if it
+        isn't in the cache."""
+        fingerprint, symmetry = puzzle.get_fingerprint()
+        row = self.db.execute(
+            "SELECT solution FROM solutions WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute(
+            "UPDATE solutions SET used = ? WHERE fingerprint = ?",
+            (time_ns(), fingerprint),
+        )
+        return transform_solution(row[0], invert_symmetry(symmetry))
+
+    def put(self, puzzle: Puzzle, solution: str):
+        """Adds the solution of the puzzle, as printed, to the cache."""
+        fingerprint, symmetry = puzzle.get_fingerprint()
+        self.db.execute(
+            "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)",
+            (fingerprint, transform_solution(solution, symmetry), time_ns()),
+        )
+        self.size += 1
+        if self.size <= self.maxsize:
+            return
+        # Counted again, with the solutions put by other processes
+        self.size = len(self)
+        excess = self.size - self.maxsize
+        if excess > 0:
+            evicted = self.db.execute(
+                "DELETE FROM solutions WHERE fingerprint IN "
+                "(SELECT fingerprint FROM solutions ORDER BY used LIMIT ?)",
+                (excess + self.maxsize // 16,),
+            ).rowcount
+            self.evictions += evicted
+            self.size -= evicted
+
+    def close(self):
+        self.db.close()
+
+    def __repr__(self):
+        return "<SolutionCache {}/{} hits={} misses={} evictions={}>".format(
+            len(self), self.maxsize, self.hits, self.misses, self.evictions
+        )
+
+
 if __name__ == "__main__":
     """Read the standard input file.
     Use a search technique to solve the instance.
     Retrieve the solution from the resulting node.
     Print to the standard output in the indicated format."""
-    brd = Board.parse_instance()
-    bimaru = Bimaru(brd)
-    goal_node = depth_first_tree_search(bimaru)
-    print(goal_node.state.board)
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Solves the Bimaru puzzle in stdin.")
+    parser.add_argument(
+        "--search",
+        choices=searchers,
+        default="lazy",
+        help="search algorithm used to solve the puzzle (default: lazy)",
+    )
+    parser.add_argument(
+        "--branching",
+        choices=branchings,
+        default="largest",
+        help="which placements are tried from each state (default: largest)",
+    )
+    parser.add_argument(
+        "--ordering",
+        choices=orderings,
+        default="scan",
+        help="order in which the placements are tried (default: scan)",
+    )
+    parser.add_argument(
+        "--table-size",
+        type=int,
+        default=0,
+        metavar="N",
+        help="keep up to N dead ends in a transposition table and print its "
+        "statistics to stderr (default: 0, no table)",
+    )
+    parser.add_argument(
+        "--portfolio",
+        nargs="*",
+        metavar="STRATEGY",
+        help="race the given strategies (search[:branching[:ordering]], e.g., "
+        "lazy:mrv) in parallel processes instead, keeping the first solution "
+        f"and printing the winner to stderr (default: {' '.join(portfolio)})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="split the search tree among N processes (0: one per CPU), "
+        "printing the time taken to stderr",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="DIR|GLOB",
+        help="solve every instance in the directory (its .txt files) or "
+        "matching the glob pattern instead of stdin, printing each solution "
+        "after a '# <instance>' line as soon as it is found",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        metavar="N",
+        help="number of processes solving the --batch instances (default: 0, "
+        "one per CPU)",
+    )
+    parser.add_argument(
+        "--summary",
+        metavar="FILE",
+        help="write a JSON line for each --batch instance to the file, with "
+        "its time, nodes expanded and generated and whether it matches its "
+        ".out file, if it has one",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        help="look the puzzle (or any rotation or reflection of it) up in the "
+        "solution cache in the SQLite database FILE before solving it, and add "
+        "its solution to it otherwise",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        metavar="N",
+        help="keep up to N solutions in the --cache, evicting the least "
+        "recently used ones (default: 100000)",
+    )
+    args = parser.parse_args()
+    if args.table_size and args.search not in ("lazy", "backtracking"):
+        parser.error("--table-size needs the lazy or backtracking search")
+    if args.portfolio is not None and args.table_size:
+        parser.error("--table-size can't be used with --portfolio")
+    if args.workers is not None and (args.table_size or args.portfolio is not None):
+        parser.error("--workers can't be used with --table-size or --portfolio")
+    if args.workers is not None and args.workers < 0:
+        parser.error("--workers must be at least 0")
+    if args.batch is not None and (args.portfolio is not None or args.workers):
+        parser.error("--batch can't be used with --portfolio or --workers")
+    if args.batch is None and args.summary is not None:
+        parser.error("--summary needs --batch")
+    if args.jobs < 0:
+        parser.error("--jobs must be at least 0")
+    if args.batch is not None and args.cache is not None:
+        parser.error("--cache can't be used with --batch")
+    if args.cache_size < 1:
+        parser.error("--cache-size must be at least 1")
+
+    if args.batch is not None:
+        from json import dumps
+
+        strategy = f"{args.search}:{args.branching}:{args.ordering}"
+        instances = find_instances(args.batch)
+        if not instances:
+            parser.error(f"no instances in {args.batch}")
+        summary_file = open(args.summary, "w") if args.summary else None
+        start, matches, unsolved = perf_counter(), [], 0
+        for summary in solve_batch(instances, strategy, args.jobs, args.table_size):
+            print(f"# {summary['instance']}")
+            if "error" in summary:
+                print(f"error: {summary['error']}")
+            else:
+                print(summary["board"] or "no solution")
+                unsolved += summary["board"] is None
+            stdout.flush()
+            if "matches" in summary:
+                matches.append(summary["matches"])
+            if summary_file:
+                print(dumps(summary), file=summary_file, flush=True)
+        if summary_file:
+            summary_file.close()
+        print(
+            f"solved {len(instances)} instances in {perf_counter() - start:.3f}s, "
+            f"{sum(matches)} of {len(matches)} matching their .out files",
+            file=stderr,
+        )
+        if unsolved:
+            raise SystemExit(1)
+    else:
+        try:
+            puzzle = Puzzle.parse(stdin)
+        except StopIteration:
+            parser.error("the instance ends too soon")
+        except ValueError as error:
+            parser.error(str(error))
+        cache = SolutionCache(args.cache, args.cache_size) if args.cache else None
+        # A cached solution skips the search altogether
+        solution = cache.get(puzzle) if cache is not None else None
+        if solution is not None:
+            board = solution
+        elif args.portfolio is not None:
+            strategies = args.portfolio or portfolio
+            try:
+                for strategy in strategies:
+                    parse_strategy(strategy)
+            except ValueError as error:
+                parser.error(str(error))
+            start = perf_counter()
+            board, winner = solve_portfolio(puzzle, strategies)
+            if winner is None:
+                parser.exit(2, f"{parser.prog}: error: every strategy failed\n")
+            print(f"won by {winner} in {perf_counter() - start:.3f}s", file=stderr)
+        elif args.workers is not None:
+            strategy = f"{args.search}:{args.branching}:{args.ordering}"
+            start = perf_counter()
+            board = solve_split(puzzle, strategy, args.workers)
+            print(f"solved in {perf_counter() - start:.3f}s", file=stderr)
+        else:
+            bimaru = Bimaru(
+                Board.from_puzzle(puzzle),
+                args.branching,
+                args.ordering,
+                args.search != "backjumping",
+            )
+            if args.table_size:
+                table = TranspositionTable(args.table_size)
+                goal_node = searchers[args.search](bimaru, table)
+                print(table, file=stderr)
+            else:
+                goal_node = searchers[args.search](bimaru)
+            board = goal_node.state.board if goal_node else None
+        if cache is not None:
+            if solution is None and board is not None:
+                cache.put(puzzle, repr(board))
+            print(cache, file=stderr)
+            cache.close()
+        # Every mode prints the same for a puzzle with no solution
+        if board is None:
+            print("no solution")
+            raise SystemExit(1)
+        print(board)
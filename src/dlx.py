@@ -0,0 +1,187 @@
+# File: dlx.py
+# Description: Exact cover solver with dancing links (Knuth's Algorithm X),
+#   extended with primary items that must be covered an exact number of
+#   times and with colored secondary items, which any number of options can
+#   cover as long as they agree on the color.
+
+from time import time
+
+
+class DancingLinks:
+    """An exact cover problem, solved with dancing links. Items are added
+    first, then options, each one with the items it covers and the colors it
+    gives to some of its secondary items. Items can be any hashable values.
+    A solution is a set of
+    options covering every primary item exactly as many times as its
+    multiplicity and every secondary item at most once, or any number of
+    times with the same color.
+    The items and options are kept in flat lists of nodes, each one linked to
+    the ones above and below it in the list of its item. Removing an option
+    from the lists of its items and putting it back are O(1) per node, and
+    removals are logged so they can be undone in reverse order when
+    backtracking. With a deadline (a time.time() value), the search raises
+    a TimeoutError once it is past it."""
+
+    def __init__(self, primary, secondary=(), preferred=()):
+        """The primary items are given as a mapping from each item to its
+        multiplicity, and the secondary ones as an iterable of items. The
+        preferred primary items are branched on first, in the given order,
+        as long as no item is forced (has no options to spare). Node 0
+        heads the list of the primary items still to be covered and nodes 1
+        to the number of items head the list of the options of each item."""
+        items = list(primary) + list(secondary)
+        self.names = [None] + items
+        self.ids = {item: node for node, item in enumerate(items, 1)}
+        self.primary_num = len(primary)
+        self.up = list(range(len(items) + 1))
+        self.down = list(range(len(items) + 1))
+        self.top = [0] * (len(items) + 1)
+        self.color = [None] * (len(items) + 1)
+        self.option = [None] * (len(items) + 1)
+        self.length = [0] * (len(items) + 1)
+        self.remaining = [0] + list(primary.values()) + [1] * len(secondary)
+        self.left = [self.primary_num] + list(range(self.primary_num))
+        self.right = list(range(1, self.primary_num + 1)) + [0]
+        self.rank = [len(preferred)] * (len(items) + 1)
+        for rank, item in enumerate(preferred):
+            self.rank[self.ids[item]] = rank
+        self.options = []  # the nodes of each option
+        self.log = []
+        self.nodes = 0
+        self.deadline = None
+
+    def add_option(self, items, colors={}):
+        """Adds an option covering the given items, with the given colors
+        (by item) for its secondary items, and returns its number."""
+        number, nodes = len(self.options), []
+        for item in items:
+            item_id, node = self.ids[item], len(self.top)
+            self.top.append(item_id)
+            self.color.append(colors.get(item))
+            self.option.append(number)
+            self.up.append(self.up[item_id])
+            self.down.append(item_id)
+            self.down[self.up[item_id]] = node
+            self.up[item_id] = node
+            self.length[item_id] += 1
+            nodes.append(node)
+        self.options.append(tuple(nodes))
+        return number
+
+    def remove_option(self, number: int):
+        """Removes the option from the list of every item it covers."""
+        up, down, length = self.up, self.down, self.length
+        for node in self.options[number]:
+            down[up[node]] = down[node]
+            up[down[node]] = up[node]
+            length[self.top[node]] -= 1
+        self.log.append(("option", number))
+
+    def restore_option(self, number: int):
+        """Puts the option back in the list of every item it covers. Options
+        must be restored in the reverse order of the one they were removed
+        in."""
+        up, down, length = self.up, self.down, self.length
+        for node in reversed(self.options[number]):
+            down[up[node]] = node
+            up[down[node]] = node
+            length[self.top[node]] += 1
+
+    def cover(self, item_id: int, color=None):
+        """Removes the options of the item, except the ones with the given
+        color, and the item itself from the list of the primary items."""
+        if item_id <= self.primary_num:
+            self.right[self.left[item_id]] = self.right[item_id]
+            self.left[self.right[item_id]] = self.left[item_id]
+            self.log.append(("item", item_id))
+        node = self.down[item_id]
+        while node != item_id:
+            following = self.down[node]
+            if color is None or self.color[node] != color:
+                self.remove_option(self.option[node])
+            node = following
+
+    def choose(self, number: int):
+        """Adds the option to the solution: it is removed, along with the
+        options it rules out, and the items it covers get one less cover to
+        go, being covered once they get none."""
+        self.remove_option(number)
+        for node in self.options[number]:
+            item_id = self.top[node]
+            if self.color[node] is not None:
+                self.cover(item_id, self.color[node])
+                continue
+            self.remaining[item_id] -= 1
+            self.log.append(("cover", item_id))
+            if self.remaining[item_id] == 0:
+                self.cover(item_id)
+
+    def undo(self, mark: int):
+        """Undoes every change logged after the given mark."""
+        log = self.log
+        while len(log) > mark:
+            kind, value = log.pop()
+            if kind == "option":
+                self.restore_option(value)
+            elif kind == "cover":
+                self.remaining[value] += 1
+            else:
+                self.right[self.left[value]] = value
+                self.left[self.right[value]] = value
+
+    def choose_item(self):
+        """Returns the primary item to branch on: a forced one, with no
+        options beyond the covers it still needs, else the first preferred
+        one and, without those, the one with the fewest options to spare,
+        like the minimum remaining values heuristic. Returns None if some
+        item doesn't have enough options left."""
+        best, best_key = None, None
+        item_id = self.right[0]
+        while item_id != 0:
+            spare = self.length[item_id] - self.remaining[item_id]
+            if spare < 0:
+                return None
+            if spare == 0:
+                return item_id
+            key = (self.rank[item_id], spare)
+            if best is None or key < best_key:
+                best, best_key = item_id, key
+            item_id = self.right[item_id]
+        return best
+
+    def solve(self):
+        """Yields every solution, as a list of option numbers. Primary items
+        with no covers to go are covered from the start."""
+        mark = len(self.log)
+        for item_id in range(1, self.primary_num + 1):
+            if self.remaining[item_id] == 0:
+                self.cover(item_id)
+        yield from self.search()
+        self.undo(mark)
+
+    def search(self):
+        """Yields every solution from the current state. Branches on the item
+        chosen by choose_item, trying each of its options in turn and leaving
+        it out of the following alternatives, so an item that takes more than
+        one cover never gets the same set of options in a different order."""
+        if self.right[0] == 0:
+            yield []
+            return
+        item_id = self.choose_item()
+        if item_id is None:
+            return
+        mark = len(self.log)
+        while self.down[item_id] != item_id:
+            number = self.option[self.down[item_id]]
+            self.nodes += 1
+            if self.deadline is not None and time() > self.deadline:
+                raise TimeoutError
+            option_mark = len(self.log)
+            self.choose(number)
+            for solution in self.search():
+                yield [number] + solution
+            self.undo(option_mark)
+            if self.length[item_id] <= self.remaining[item_id]:
+                break  # the others aren't enough without this one
+            self.remove_option(number)
+        self.undo(mark)
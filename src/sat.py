@@ -0,0 +1,331 @@
+# File: sat.py
+# Description: Conflict-driven clause learning (CDCL) SAT solver, with two
+#   watched literals, first UIP clause learning, VSIDS branching, phase
+#   saving and Luby restarts, along with the encoding of cardinality
+#   constraints into clauses.
+
+from time import time
+
+
+def luby(i: int):
+    """Returns the i-th term (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2,
+    4, 1, 1, 2, 1, 1, 2, 4, 8, ..., which sets the length of the runs
+    between restarts."""
+    size = 1
+    while size < i + 1:
+        size = 2 * size + 1
+    while size - 1 != i:
+        size //= 2
+        i %= size
+    return (size + 1) // 2
+
+
+class Solver:
+    """A CDCL SAT solver. Variables are numbered from 1, as returned by
+    new_var, and literals are given as in DIMACS, i.e., a variable for itself
+    and its negation for its complement. Internally, the literals of
+    variable v are 2v and 2v + 1 (the complement), so that they can index
+    lists, and the complement of a literal is its XOR with 1. The unassigned
+    variables are kept in a binary heap by activity, with the position of
+    each one in it, so a bumped variable can move up in place.
+    Clauses can be added between calls to solve, e.g., to block the
+    solutions already found, so the solutions of a formula can be counted
+    by solving it again until it is unsatisfiable. The solver counts its
+    decisions, propagations, conflicts and restarts. With a deadline (a
+    time.time() value), solve raises a TimeoutError once it is past it."""
+
+    def __init__(self, restart_base=100, decay=0.95):
+        self.values = [0, 0]  # of each literal: 1 true, -1 false, 0 unassigned
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phases = [False]
+        self.watches = [[], []]
+        self.clauses, self.learnts = [], []
+        self.trail, self.trail_lims, self.head = [], [], 0
+        self.heap, self.heap_index = [], [-1]
+        self.var_inc, self.decay = 1.0, decay
+        self.restart_base = restart_base
+        self.unsat = False
+        self.model = None
+        self.deadline = None
+        self.decisions = self.propagations = self.conflicts = self.restarts = 0
+
+    def new_var(self):
+        """Adds a variable and returns its number."""
+        var = len(self.levels)
+        self.values += [0, 0]
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.phases.append(False)
+        self.watches += [[], []]
+        self.heap_index.append(-1)
+        self.heap_insert(var)
+        return var
+
+    def add_clause(self, literals):
+        """Adds a clause, given as an iterable of DIMACS literals. Returns
+        False if the formula became unsatisfiable."""
+        self.cancel_until(0)
+        clause, values = [], self.values
+        for literal in literals:
+            lit = 2 * literal if literal > 0 else -2 * literal + 1
+            if values[lit] == 1 or lit ^ 1 in clause:
+                return True  # satisfied or a tautology
+            if values[lit] == 0 and lit not in clause:
+                clause.append(lit)
+        if not clause:
+            self.unsat = True
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            self.unsat = self.unsat or self.propagate() is not None
+        else:
+            self.watches[clause[0]].append(clause)
+            self.watches[clause[1]].append(clause)
+            self.clauses.append(clause)
+        return not self.unsat
+
+    def assign(self, lit: int, reason):
+        """Makes the literal true, at the current decision level."""
+        var = lit >> 1
+        self.values[lit], self.values[lit ^ 1] = 1, -1
+        self.levels[var] = len(self.trail_lims)
+        self.reasons[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        """Assigns the literals implied by unit clauses, following the
+        literals watched by each clause. Returns a clause with every literal
+        false, if there is one, else None."""
+        values, watches, trail = self.values, self.watches, self.trail
+        levels, reasons, level = self.levels, self.reasons, len(self.trail_lims)
+        while self.head < len(trail):
+            false_lit = trail[self.head] ^ 1
+            self.head += 1
+            self.propagations += 1
+            watching = watches[false_lit]
+            kept, i = [], 0
+            while i < len(watching):
+                clause = watching[i]
+                i += 1
+                # The false literal is always kept second
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if values[first] == 1:
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    if values[clause[k]] != -1:
+                        clause[1], clause[k] = clause[k], false_lit
+                        watches[clause[1]].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if values[first] == -1:
+                        kept.extend(watching[i:])
+                        watches[false_lit] = kept
+                        self.head = len(trail)
+                        return clause
+                    values[first], values[first ^ 1] = 1, -1
+                    levels[first >> 1], reasons[first >> 1] = level, clause
+                    trail.append(first)
+            watches[false_lit] = kept
+        return None
+
+    def analyze(self, conflict):
+        """Returns the first UIP clause learned from the conflict, with the
+        asserting literal first and a literal of the level to backtrack to
+        second, and that level. The variables involved get bumped."""
+        levels, reasons, trail = self.levels, self.reasons, self.trail
+        level = len(self.trail_lims)
+        seen, learnt = set(), [None]
+        pending, index, lit = 0, len(trail) - 1, None
+        clause = conflict
+        while True:
+            for other in clause:
+                if other == lit:
+                    continue
+                var = other >> 1
+                if var in seen or levels[var] == 0:
+                    continue
+                seen.add(var)
+                self.bump(var)
+                if levels[var] == level:
+                    pending += 1
+                else:
+                    learnt.append(other)
+            while trail[index] >> 1 not in seen:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = reasons[lit >> 1]
+        learnt[0] = lit ^ 1
+        if len(learnt) == 1:
+            return learnt, 0
+        deepest = max(range(1, len(learnt)), key=lambda k: levels[learnt[k] >> 1])
+        learnt[1], learnt[deepest] = learnt[deepest], learnt[1]
+        return learnt, levels[learnt[1] >> 1]
+
+    def bump(self, var: int):
+        """Raises the activity of the variable, rescaling every activity once
+        they get too large."""
+        self.activity[var] += self.var_inc
+        if self.activity[var] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.var_inc *= 1e-100
+        if self.heap_index[var] >= 0:
+            self.heap_up(self.heap_index[var])
+
+    def heap_insert(self, var: int):
+        """Adds the variable to the heap, if it isn't there."""
+        if self.heap_index[var] < 0:
+            self.heap_index[var] = len(self.heap)
+            self.heap.append(var)
+            self.heap_up(len(self.heap) - 1)
+
+    def heap_up(self, pos: int):
+        """Moves the variable at the given position of the heap up, while it
+        is more active than its parent."""
+        heap, index, activity = self.heap, self.heap_index, self.activity
+        var = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if activity[heap[parent]] >= activity[var]:
+                break
+            heap[pos] = heap[parent]
+            index[heap[pos]] = pos
+            pos = parent
+        heap[pos], index[var] = var, pos
+
+    def heap_pop(self):
+        """Removes and returns the most active variable of the heap."""
+        heap, index, activity = self.heap, self.heap_index, self.activity
+        top, var = heap[0], heap.pop()
+        index[top] = -1
+        if heap:
+            pos, size = 0, len(heap)
+            while 2 * pos + 1 < size:
+                child, right = 2 * pos + 1, 2 * pos + 2
+                if right < size and activity[heap[right]] > activity[heap[child]]:
+                    child = right
+                if activity[heap[child]] <= activity[var]:
+                    break
+                heap[pos] = heap[child]
+                index[heap[pos]] = pos
+                pos = child
+            heap[pos], index[var] = var, pos
+        return top
+
+    def cancel_until(self, level: int):
+        """Undoes the assignments of the decision levels above the given one,
+        saving the phase of their variables."""
+        if len(self.trail_lims) <= level:
+            return
+        values, trail, index = self.values, self.trail, self.heap_index
+        start = self.trail_lims[level]
+        for lit in trail[start:]:
+            var = lit >> 1
+            values[lit] = values[lit ^ 1] = 0
+            self.reasons[var] = None
+            self.phases[var] = not lit & 1
+            if index[var] < 0:
+                self.heap_insert(var)
+        del trail[start:]
+        del self.trail_lims[level:]
+        self.head = start
+
+    def pick_branch(self):
+        """Returns the literal of the unassigned variable with the highest
+        activity, in its saved phase, or None if every variable is
+        assigned."""
+        while self.heap:
+            var = self.heap_pop()
+            if self.values[2 * var] == 0:
+                return 2 * var if self.phases[var] else 2 * var + 1
+        return None
+
+    def solve(self):
+        """Searches for a model of the clauses added so far. Returns True and
+        keeps the model (the value of each variable, from 1) if there is one,
+        else False."""
+        self.model = None
+        if self.unsat:
+            return False
+        restart, run_conflicts = 0, 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                run_conflicts += 1
+                if not self.trail_lims:
+                    self.unsat = True
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.cancel_until(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.watches[learnt[0]].append(learnt)
+                    self.watches[learnt[1]].append(learnt)
+                    self.learnts.append(learnt)
+                    self.assign(learnt[0], learnt)
+                self.var_inc /= self.decay
+                continue
+            if run_conflicts >= self.restart_base * luby(restart):
+                self.restarts += 1
+                restart, run_conflicts = restart + 1, 0
+                self.cancel_until(0)
+                continue
+            lit = self.pick_branch()
+            if lit is None:
+                self.model = [None] + [
+                    self.values[2 * var] == 1 for var in range(1, len(self.levels))
+                ]
+                self.cancel_until(0)
+                return True
+            self.decisions += 1
+            if self.deadline is not None and time() > self.deadline:
+                self.cancel_until(0)
+                raise TimeoutError
+            self.trail_lims.append(len(self.trail))
+            self.assign(lit, None)
+
+
+def add_exactly(solver: Solver, literals, count: int):
+    """Adds the clauses making exactly the given number of the literals true,
+    with a sequential counter: auxiliary variable s(i, j) is true if and only
+    if at least j of the first i literals are."""
+    literals = list(literals)
+    if count < 0 or count > len(literals):
+        solver.add_clause([])
+        return
+    if count == 0 or count == len(literals):
+        for literal in literals:
+            solver.add_clause([literal if count else -literal])
+        return
+    previous = [None] * (count + 2)  # s(i - 1, j), None when it is false
+    for literal in literals:
+        current = [None] * (count + 2)
+        for j in range(1, count + 2):
+            if previous[j - 1] is None and j > 1:
+                break  # can't have j true literals among the first i
+            var = current[j] = solver.new_var()
+            # s(i, j) if s(i - 1, j), or if s(i - 1, j - 1) and the literal
+            before = [previous[j]] if previous[j] is not None else []
+            solver.add_clause([-var, literal] + before)
+            for other in before:
+                solver.add_clause([-other, var])
+            if j == 1:
+                solver.add_clause([-literal, var])
+            else:
+                solver.add_clause([-previous[j - 1], -literal, var])
+                solver.add_clause([-var, previous[j - 1]])
+        previous = current
+    solver.add_clause([previous[count]])
+    if previous[count + 1] is not None:
+        solver.add_clause([-previous[count + 1]])
@@ -0,0 +1,617 @@
+# File: search_core.py
+# Description: The parts of the AIMA search module (search.py) the solver
+#   runs: the problem and node classes, the tree searches and the informed
+#   searches it offers, along with the helpers they need from utils.py.
+#   Unlike search.py, it only imports the standard library, so the solver
+#   doesn't load numpy and the rest of the AIMA code at every start.
+#   search.py and utils.py import these names back from it.
+
+import functools
+import heapq
+from collections import OrderedDict, deque
+from math import inf
+
+# ______________________________________________________________________________
+# Functions from utils.py
+
+
+def is_in(elt, seq):
+    """Similar to (elt in seq), but compares with 'is', not '=='."""
+    return any(x is elt for x in seq)
+
+
+def memoize(fn, slot=None, maxsize=32):
+    """Memoize fn: make it remember the computed value for any argument list.
+    If slot is specified, store result in that slot of first argument.
+    If slot is false, use lru_cache for caching the values."""
+    if slot:
+
+        def memoized_fn(obj, *args):
+            if hasattr(obj, slot):
+                return getattr(obj, slot)
+            else:
+                val = fn(obj, *args)
+                setattr(obj, slot, val)
+                return val
+
+    else:
+
+        @functools.lru_cache(maxsize=maxsize)
+        def memoized_fn(*args):
+            return fn(*args)
+
+    return memoized_fn
+
+
+# ______________________________________________________________________________
+# Queues
+
+
+class PriorityQueue:
+    """A Queue in which the minimum (or maximum) element
+    (as determined by f and order) is returned first.
+    If order is 'min', the item with minimum f(x) is
+    returned first; if order is 'max', then it is the item with maximum f(x).
+    Also supports dict-like lookup."""
+
+    def __init__(self, order="min", f=lambda x: x):
+        self.heap = []
+        if order == "min":
+            self.f = f
+        elif order == "max":  # now item with max f(x)
+            self.f = lambda x: -f(x)  # will be popped first
+        else:
+            raise ValueError("Order must be either 'min' or 'max'.")
+
+    def append(self, item):
+        """Insert item at its correct position."""
+        heapq.heappush(self.heap, (self.f(item), item))
+
+    def extend(self, items):
+        """Insert each item in items at its correct position."""
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order."""
+        if self.heap:
+            return heapq.heappop(self.heap)[1]
+        else:
+            raise Exception("Trying to pop from empty PriorityQueue.")
+
+    def __len__(self):
+        """Return current capacity of PriorityQueue."""
+        return len(self.heap)
+
+    def __contains__(self, key):
+        """Return True if the key is in PriorityQueue."""
+        return any([item == key for _, item in self.heap])
+
+    def __getitem__(self, key):
+        """Returns the first value associated with key in PriorityQueue.
+        Raises KeyError if key is not present."""
+        for value, item in self.heap:
+            if item == key:
+                return value
+        raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete the first occurrence of key."""
+        try:
+            del self.heap[[item == key for _, item in self.heap].index(True)]
+        except ValueError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        heapq.heapify(self.heap)
+
+
+# ______________________________________________________________________________
+
+
+class Problem:
+    """The abstract class for a formal problem. You should subclass
+    this and implement the methods actions and result, and possibly
+    __init__, goal_test, and path_cost. Then you will create instances
+    of your subclass and solve them with the various search functions."""
+
+    def __init__(self, initial, goal=None):
+        """The constructor specifies the initial state, and possibly a goal
+        state, if there is a unique goal. Your subclass's constructor can add
+        other arguments."""
+        self.initial = initial
+        self.goal = goal
+
+    def actions(self, state):
+        """Return the actions that can be executed in the given
+        state. The result would typically be a list, but if there are
+        many actions, consider yielding them one at a time in an
+        iterator, rather than building them all at once."""
+        raise NotImplementedError
+
+    def result(self, state, action):
+        """Return the state that results from executing the given
+        action in the given state. The action must be one of
+        self.actions(state)."""
+        raise NotImplementedError
+
+    def goal_test(self, state):
+        """Return True if the state is a goal. The default method compares the
+        state to self.goal or checks for state in self.goal if it is a
+        list, as specified in the constructor. Override this method if
+        checking against a single self.goal is not enough."""
+        if isinstance(self.goal, list):
+            return is_in(state, self.goal)
+        else:
+            return state == self.goal
+
+    def path_cost(self, c, state1, action, state2):
+        """Return the cost of a solution path that arrives at state2 from
+        state1 via action, assuming cost c to get up to state1. If the problem
+        is such that the path doesn't matter, this function will only look at
+        state2. If the path does matter, it will consider c and maybe state1
+        and action. The default method costs 1 for every step in the path."""
+        return c + 1
+
+    def value(self, state):
+        """For optimization problems, each state has a value. Hill Climbing
+        and related algorithms try to maximize this value."""
+        raise NotImplementedError
+
+    def apply(self, state, action):
+        """Change the given state in place by executing the action, and
+        return whatever self.undo needs to revert it. Only needed by the
+        searches that keep a single state, like
+        depth_first_backtracking_search."""
+        raise NotImplementedError
+
+    def undo(self, state, token):
+        """Revert, in place, the action whose self.apply returned the given
+        token. Actions are always undone in the reverse order of the one in
+        which they were applied."""
+        raise NotImplementedError
+
+    def state_key(self, state):
+        """Return a hashable key of the state, equal for any two states from
+        which the search goes on in the same way. Used by the searches that
+        keep a TranspositionTable of dead ends. The default is the state
+        itself."""
+        return state
+
+    def explain(self, actions, conflict, tried):
+        """Return a nogood of the dead end reached by the given actions: a
+        subset of them that no goal can be reached from, whatever the other
+        actions taken. The conflict is a subset of the actions that, along
+        with any of the tried ones, is known to be a nogood, so the nogood
+        must contain it. Used by depth_first_backjumping_search. The default
+        is every action, which makes it backtrack chronologically."""
+        return list(actions)
+
+
+# ______________________________________________________________________________
+
+
+class Node:
+    """A node in a search tree. Contains a pointer to the parent (the node
+    that this is a successor of) and to the actual state for this node. Note
+    that if a state is arrived at by two paths, then there are two nodes with
+    the same state. Also includes the action that got us to this state, and
+    the total path_cost (also known as g) to reach the node. Other functions
+    may add an f and h value; see best_first_graph_search and astar_search for
+    an explanation of how the f and h values are handled. You will not need to
+    subclass this class. Nodes are slotted, since searches can keep a large
+    number of them alive; f and h are the slots used by the informed
+    searches."""
+
+    __slots__ = ("state", "parent", "action", "path_cost", "depth", "f", "h")
+
+    def __init__(self, state, parent=None, action=None, path_cost=0):
+        """Create a search tree Node, derived from a parent by an action."""
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.path_cost = path_cost
+        self.depth = 0
+        if parent:
+            self.depth = parent.depth + 1
+
+    def __repr__(self):
+        return "<Node {}>".format(self.state)
+
+    def __lt__(self, node):
+        return self.state < node.state
+
+    def expand(self, problem):
+        """List the nodes reachable in one step from this node."""
+        return [
+            self.child_node(problem, action) for action in problem.actions(self.state)
+        ]
+
+    def child_node(self, problem, action):
+        """[Figure 3.10]"""
+        next_state = problem.result(self.state, action)
+        next_node = Node(
+            next_state,
+            self,
+            action,
+            problem.path_cost(self.path_cost, self.state, action, next_state),
+        )
+        return next_node
+
+    def solution(self):
+        """Return the sequence of actions to go from the root to this node."""
+        return [node.action for node in self.path()[1:]]
+
+    def path(self):
+        """Return a list of nodes forming the path from the root to
+        this node."""
+        node, path_back = self, []
+        while node:
+            path_back.append(node)
+            node = node.parent
+        return list(reversed(path_back))
+
+    # We want for a queue of nodes in breadth_first_graph_search or
+    # astar_search to have no duplicated states, so we treat nodes
+    # with the same state as equal. [Problem: this may not be what you
+    # want in other contexts.]
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.state == other.state
+
+    def __hash__(self):
+        # We use the hash value of the state
+        # stored in the node instead of the node
+        # object itself to quickly search a node
+        # with the same state in a Hash Table
+        return hash(self.state)
+
+
+# ______________________________________________________________________________
+# Uninformed Search algorithms
+
+
+def breadth_first_tree_search(problem):
+    """
+    [Figure 3.7]
+    Search the shallowest nodes in the search tree first.
+    Search through the successors of a problem to find a goal.
+    The argument frontier should be an empty queue.
+    Repeats infinitely in case of loops.
+    """
+
+    frontier = deque([Node(problem.initial)])  # FIFO queue
+
+    while frontier:
+        node = frontier.popleft()
+        if problem.goal_test(node.state):
+            return node
+        frontier.extend(node.expand(problem))
+    return None
+
+
+def depth_first_tree_search(problem):
+    """
+    [Figure 3.7]
+    Search the deepest nodes in the search tree first.
+    Search through the successors of a problem to find a goal.
+    The argument frontier should be an empty queue.
+    Repeats infinitely in case of loops.
+    """
+
+    frontier = [Node(problem.initial)]  # Stack
+
+    while frontier:
+        node = frontier.pop()
+        if problem.goal_test(node.state):
+            return node
+        frontier.extend(node.expand(problem))
+    return None
+
+
+class TranspositionTable:
+    """A table of the keys of the states known to be dead ends, i.e., from
+    which no goal can be reached, so that the searches don't explore them
+    again when they are reached through another path. It keeps at most
+    maxsize keys, evicting the least recently used one when it is full, and
+    counts its hits, misses and evictions."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.keys = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key):
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
+        """Add the key of a dead end to the table."""
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+        if len(self.keys) > self.maxsize:
+            self.keys.popitem(last=False)
+            self.evictions += 1
+
+    def __repr__(self):
+        return "<TranspositionTable {}/{} hits={} misses={} evictions={}>".format(
+            len(self.keys), self.maxsize, self.hits, self.misses, self.evictions
+        )
+
+
+def depth_first_lazy_search(problem, table=None):
+    """
+    Search the deepest nodes in the search tree first, in the same order as
+    depth_first_tree_search, but build each child only when the search gets
+    to it. The stack keeps, for each node in the current path, an iterator
+    over its pending actions, and the goal test is done as soon as a child is
+    built. Siblings that are never explored are never built.
+    If a TranspositionTable is given, the states whose actions were all
+    explored are added to it, and states found in it are not explored.
+    """
+
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node
+    key = problem.state_key(node.state) if table is not None else None
+    frontier = [(node, reversed(problem.actions(node.state)), key)]  # Stack
+
+    while frontier:
+        node, actions, key = frontier[-1]
+        action = next(actions, None)
+        if action is None:
+            frontier.pop()
+            if table is not None:
+                table.add(key)
+            continue
+        child = node.child_node(problem, action)
+        if problem.goal_test(child.state):
+            return child
+        if table is not None:
+            key = problem.state_key(child.state)
+            if key in table:
+                continue
+        frontier.append((child, reversed(problem.actions(child.state)), key))
+    return None
+
+
+def depth_first_backtracking_search(problem, table=None):
+    """
+    Search the deepest nodes in the search tree first, in the same order as
+    depth_first_tree_search, but keep a single state that is changed in place
+    with problem.apply and restored with problem.undo when backtracking.
+    Memory only grows with the depth of the search, not with its branching.
+    Returns a node with the goal state, without the path that led to it.
+    A TranspositionTable can be given, as in depth_first_lazy_search.
+    """
+
+    state = problem.initial
+    if problem.goal_test(state):
+        return Node(state)
+    key = problem.state_key(state) if table is not None else None
+    frontier = [(reversed(problem.actions(state)), key)]  # Stack of pending actions
+    tokens = []
+
+    while frontier:
+        actions, key = frontier[-1]
+        action = next(actions, None)
+        if action is None:
+            frontier.pop()
+            if table is not None:
+                table.add(key)
+            if tokens:
+                problem.undo(state, tokens.pop())
+            continue
+        tokens.append(problem.apply(state, action))
+        if problem.goal_test(state):
+            return Node(state)
+        if table is not None:
+            key = problem.state_key(state)
+            if key in table:
+                problem.undo(state, tokens.pop())
+                continue
+        frontier.append((reversed(problem.actions(state)), key))
+    return None
+
+
+def depth_first_backjumping_search(problem):
+    """
+    Search the deepest nodes in the search tree first, as
+    depth_first_lazy_search, but with conflict-directed backjumping. When a
+    node is a dead end, problem.explain gives the nogood of it, i.e., the
+    actions on its path that caused it, and the search jumps back to the
+    deepest of them, skipping the nodes in between, which are dead ends for
+    the same reason. Nogoods are kept, so a child whose path has every
+    action of one is never built. The order of the actions on a path must
+    not matter to the state it leads to.
+    """
+
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node
+    path, nogoods = [], {}  # nogoods by each of their actions
+    frontier = [(node, reversed(problem.actions(node.state)), set(), [])]  # Stack
+
+    while frontier:
+        node, actions, conflict, tried = frontier[-1]
+        action = next(actions, None)
+        if action is None:
+            nogood = problem.explain(path, conflict, tried)
+            if not nogood:
+                return None
+            for culprit in nogood:
+                nogoods.setdefault(culprit, []).append(nogood)
+            # Every node whose path has the deepest culprit is a dead end
+            depth = max(path.index(culprit) for culprit in nogood)
+            action = path[depth]
+            del frontier[depth + 1 :]
+            del path[depth:]
+            _, _, conflict, tried = frontier[-1]
+            conflict.update(culprit for culprit in nogood if culprit != action)
+            tried.append(action)
+            continue
+        path.append(action)
+        learned = next(
+            (
+                nogood
+                for nogood in nogoods.get(action, ())
+                if all(culprit in path for culprit in nogood)
+            ),
+            None,
+        )
+        if learned is not None:
+            path.pop()
+            conflict.update(culprit for culprit in learned if culprit != action)
+            tried.append(action)
+            continue
+        child = node.child_node(problem, action)
+        if problem.goal_test(child.state):
+            return child
+        frontier.append((child, reversed(problem.actions(child.state)), set(), []))
+    return None
+
+
+def best_first_graph_search(problem, f, display=False):
+    """Search the nodes with the lowest f scores first.
+    You specify the function f(node) that you want to minimize; for example,
+    if f is a heuristic estimate to the goal, then we have greedy best
+    first search; if f is node.depth then we have breadth-first search.
+    There is a subtlety: the line "f = memoize(f, 'f')" means that the f
+    values will be cached on the nodes as they are computed. So after doing
+    a best first search you can examine the f values of the path returned."""
+    f = memoize(f, "f")
+    node = Node(problem.initial)
+    frontier = PriorityQueue("min", f)
+    frontier.append(node)
+    explored = set()
+    while frontier:
+        node = frontier.pop()
+        if problem.goal_test(node.state):
+            if display:
+                print(
+                    len(explored),
+                    "paths have been expanded and",
+                    len(frontier),
+                    "paths remain in the frontier",
+                )
+            return node
+        explored.add(node.state)
+        for child in node.expand(problem):
+            if child.state not in explored and child not in frontier:
+                frontier.append(child)
+            elif child in frontier:
+                if f(child) < frontier[child]:
+                    del frontier[child]
+                    frontier.append(child)
+    return None
+
+
+# ______________________________________________________________________________
+# Informed (Heuristic) Search
+
+
+# Greedy best-first search is accomplished by specifying f(n) = h(n).
+def greedy_search(problem, h=None):
+    """f(n) = h(n)"""
+    h = memoize(h or problem.h, "h")
+    return best_first_graph_search(problem, h)
+
+
+def astar_search(problem, h=None, display=False):
+    """A* search is best-first graph search with f(n) = g(n)+h(n).
+    You need to specify the h function when you call astar_search, or
+    else in your Problem subclass."""
+    h = memoize(h or problem.h, "h")
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+
+
+def recursive_best_first_search(problem, h=None):
+    """[Figure 3.26]"""
+    h = memoize(h or problem.h, "h")
+
+    def RBFS(problem, node, flimit):
+        if problem.goal_test(node.state):
+            return node, 0  # (The second value is immaterial)
+        successors = node.expand(problem)
+        if len(successors) == 0:
+            return None, inf
+        for s in successors:
+            s.f = max(s.path_cost + h(s), node.f)
+        while True:
+            # Order by lowest f value
+            successors.sort(key=lambda x: x.f)
+            best = successors[0]
+            if best.f > flimit:
+                return None, best.f
+            if len(successors) > 1:
+                alternative = successors[1].f
+            else:
+                alternative = inf
+            result, best.f = RBFS(problem, best, min(flimit, alternative))
+            if result is not None:
+                return result, best.f
+
+    node = Node(problem.initial)
+    node.f = h(node)
+    result, bestf = RBFS(problem, node, inf)
+    return result
+
+
+# ______________________________________________________________________________
+
+
+class InstrumentedProblem(Problem):
+    """Delegates to a problem, and keeps statistics."""
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.succs = self.goal_tests = self.states = 0
+        self.found = None
+
+    def actions(self, state):
+        self.succs += 1
+        return self.problem.actions(state)
+
+    def result(self, state, action):
+        self.states += 1
+        return self.problem.result(state, action)
+
+    def goal_test(self, state):
+        self.goal_tests += 1
+        result = self.problem.goal_test(state)
+        if result:
+            self.found = state
+        return result
+
+    def path_cost(self, c, state1, action, state2):
+        return self.problem.path_cost(c, state1, action, state2)
+
+    def value(self, state):
+        return self.problem.value(state)
+
+    def apply(self, state, action):
+        self.states += 1
+        return self.problem.apply(state, action)
+
+    def undo(self, state, token):
+        return self.problem.undo(state, token)
+
+    def state_key(self, state):
+        return self.problem.state_key(state)
+
+    def explain(self, actions, conflict, tried):
+        return self.problem.explain(actions, conflict, tried)
+
+    def __getattr__(self, attr):
+        return getattr(self.problem, attr)
+
+    def __repr__(self):
+        return "<{:4d}/{:4d}/{:4d}/{}>".format(
+            self.succs, self.goal_tests, self.states, str(self.found)[:4]
+        )
@@ -0,0 +1,397 @@
+# File: server.py
+# Description: Long-lived solver daemon. An asyncio server, on a Unix domain
+#   socket or a localhost TCP port, reads puzzles from its connections and
+#   solves them in a pool of processes started (and warmed up) beforehand,
+#   so no request pays for starting the interpreter or importing the solver.
+# Usage: python3 src/server.py (--socket PATH | --port N) [--jobs N]
+#   [--queue-size N] [--deadline SECONDS] [--strategy lazy] [--cache FILE]
+#   [--shutdown-timeout SECONDS]
+#
+# Requests are either instances in the input format (ROW, COLUMN, optional
+# FLEET, hint total and HINT lines) or JSON objects on a single line, with the
+# "rows", "cols", "hints" and "fleet" of the puzzle (as taken by get_puzzle)
+# and, optionally, an "id", a "strategy" (see parse_strategy) and a
+# "deadline" in seconds. Any number of requests can be sent on a connection
+# without waiting for the responses, which are JSON lines sent back in the
+# order of the requests, with their "id" (or their number on the connection),
+# a "status" ("solved", "unsolvable", "timeout" or "error") and, once solved,
+# the "board" and the "time" taken, or "cached" if it came from the --cache.
+
+import asyncio
+import json
+import os
+import signal
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter, time
+
+from bimaru import (
+    Bimaru,
+    Board,
+    SolutionCache,
+    get_puzzle,
+    parse_strategy,
+    searchers,
+)
+from search_core import InstrumentedProblem
+
+
+class DeadlineProblem(InstrumentedProblem):
+    """Delegates to a problem, like InstrumentedProblem, but raises a
+    TimeoutError when the actions of a state are asked for after the
+    deadline (a time.time() value), which stops any search over states.
+    The dlx and sat searches check the deadline themselves."""
+
+    def __init__(self, problem, deadline):
+        super().__init__(problem)
+        self.deadline = deadline
+
+    def actions(self, state):
+        if self.deadline is not None and time() > self.deadline:
+            raise TimeoutError
+        return super().actions(state)
+
+
+def warm_up(_=None):
+    """Fills the caches of the solver for the usual board size and fleet,
+    in a process of the pool, before any request gets to it."""
+    Board.from_puzzle(get_puzzle((0,) * 10, (0,) * 10))
+
+
+def get_request_puzzle(request: dict):
+    """Returns the puzzle of a request."""
+    return get_puzzle(
+        request["rows"],
+        request["cols"],
+        request.get("hints", ()),
+        request.get("fleet", (0, 4, 3, 2, 1)),
+    )
+
+
+def get_request_options(request: dict, deadline, strategy: str):
+    """Returns the deadline, in seconds, and the strategy of a request, with
+    the given defaults for the ones it doesn't have. Raises a ValueError if
+    either one is invalid."""
+    seconds = request.get("deadline", deadline)
+    if seconds is not None and (
+        isinstance(seconds, bool)
+        or not isinstance(seconds, (int, float))
+        or not 0 <= seconds < float("inf")
+    ):
+        raise ValueError(f"invalid deadline: {seconds!r}")
+    strategy = request.get("strategy", strategy)
+    if not isinstance(strategy, str):
+        raise ValueError(f"invalid strategy: {strategy!r}")
+    parse_strategy(strategy)
+    return seconds, strategy
+
+
+def get_error_response(error: Exception):
+    """Returns the response to a request that failed with the error."""
+    return {"status": "error", "error": f"{type(error).__name__}: {error}"}
+
+
+def solve_request(request: dict, strategy: str, deadline):
+    """Solves the puzzle of a request, in a process of the pool, with the
+    given strategy, giving up at the deadline, if any. Returns the status of
+    the response and, once solved, the board and the time taken."""
+    start = perf_counter()
+    try:
+        search, branching, ordering = parse_strategy(strategy)
+        board = Board.from_puzzle(get_request_puzzle(request))
+        problem = DeadlineProblem(
+            Bimaru(board, branching, ordering, search != "backjumping"), deadline
+        )
+        goal_node = searchers[search](problem)
+    except TimeoutError:
+        return {"status": "timeout"}
+    except Exception as error:
+        return get_error_response(error)
+    if goal_node is None:
+        return {"status": "unsolvable", "time": round(perf_counter() - start, 6)}
+    return {
+        "status": "solved",
+        "board": repr(goal_node.state.board),
+        "time": round(perf_counter() - start, 6),
+    }
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Reads the next request of a connection, skipping blank lines, and
+    returns it as a dict, with an "error" if it can't be read, or None once
+    the connection is closed."""
+    line = b"\n"
+    while line and not line.strip():
+        line = await reader.readline()
+    if not line:
+        return None
+    line = line.decode(errors="replace").strip()
+    if line.startswith("{"):
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return {"error": f"invalid JSON: {error}"}
+        if not isinstance(request, dict) or "rows" not in request:
+            return {"error": "a JSON request needs its rows and cols"}
+        return request
+    if not line.startswith("ROW"):
+        return {"error": f"unexpected line: {line[:40]!r}"}
+
+    # An instance in the input format has as many lines as its hint total says
+    lines = [line]
+    try:
+        while len(lines) < 3 or lines[-1].startswith("FLEET"):
+            lines.append((await reader.readline()).decode().strip())
+        request = {"rows": lines[0], "cols": lines[1], "hints": []}
+        if lines[2].startswith("FLEET"):
+            request["fleet"] = lines[2]
+        for _ in range(int(lines[-1])):
+            request["hints"].append((await reader.readline()).decode().strip())
+    except ValueError as error:
+        return {"error": f"invalid instance: {error}"}
+    return request
+
+
+class SolverServer:
+    """Solves the requests of every connection in a pool of processes. At
+    most queue_size requests are queued or being solved at once: past that,
+    no more requests are read from any connection until one is done, so
+    clients sending too many are held back by the socket itself instead of
+    piling up work. Requests with no deadline of their own get the default
+    one, in seconds, counted from when they are read (None for no
+    deadline). With a SolutionCache, puzzles found in it (or rotations or
+    reflections of them) are answered right away, without a search, and
+    the solutions found are added to it. The cache is only used from a
+    thread of its own, as its queries can wait on the database lock."""
+
+    def __init__(
+        self, jobs: int, queue_size: int, deadline=None, strategy="lazy", cache=None
+    ):
+        parse_strategy(strategy)
+        self.cache = cache
+        self.cache_thread = ThreadPoolExecutor(1) if cache is not None else None
+        self.jobs = jobs
+        self.deadline = deadline
+        self.strategy = strategy
+        self.slots = asyncio.Semaphore(queue_size)
+        warm_up()  # forked processes start with the caches filled
+        self.pool = ProcessPoolExecutor(jobs)
+        self.requests = 0
+        self.readers = set()  # the tasks reading requests from connections
+        self.senders = set()  # and the ones sending their responses back
+
+    async def start(self):
+        """Starts every process of the pool, so no request waits for one."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self.pool, warm_up) for _ in range(self.jobs))
+        )
+
+    async def solve(self, request: dict):
+        """Returns the response to the request, releasing its slot once it is
+        done."""
+        try:
+            if "error" in request:
+                return {"status": "error", "error": request["error"]}
+            try:
+                seconds, strategy = get_request_options(
+                    request, self.deadline, self.strategy
+                )
+            except ValueError as error:
+                return get_error_response(error)
+            if self.cache is not None:
+                try:
+                    puzzle = get_request_puzzle(request)
+                except Exception as error:
+                    return get_error_response(error)
+                solution = await asyncio.get_running_loop().run_in_executor(
+                    self.cache_thread, self.cache.get, puzzle
+                )
+                if solution is not None:
+                    return {"status": "solved", "board": solution, "cached": True}
+            deadline = time() + seconds if seconds is not None else None
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.pool, solve_request, request, strategy, deadline
+            )
+            try:
+                response = await asyncio.wait_for(
+                    future, seconds + 1 if seconds is not None else None
+                )
+            except asyncio.TimeoutError:
+                return {"status": "timeout"}
+            except BrokenProcessPool as error:
+                return get_error_response(error)  # terminated by close
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # Its solve was still queued when close shut the pool down
+                return {"status": "error", "error": "the server is stopping"}
+            if self.cache is not None and response["status"] == "solved":
+                await loop.run_in_executor(
+                    self.cache_thread, self.cache.put, puzzle, response["board"]
+                )
+            return response
+        finally:
+            self.slots.release()
+
+    async def close(self, timeout: float):
+        """Stops reading requests from every connection and shuts the pool
+        down, cancelling the requests still queued. The ones being solved
+        get up to timeout seconds to finish, after which the processes of
+        the pool are terminated. Returns once the responses of every
+        connection are sent and the connections are closed."""
+        for reader in self.readers:
+            reader.cancel()
+        # The executor has no public way to get at its processes
+        processes = list(self.pool._processes.values())
+        shutdown = asyncio.ensure_future(
+            asyncio.to_thread(self.pool.shutdown, cancel_futures=True)
+        )
+        try:
+            await asyncio.wait_for(asyncio.shield(shutdown), timeout)
+        except asyncio.TimeoutError:
+            for process in processes:
+                process.terminate()
+            await shutdown
+        await asyncio.gather(*self.senders, return_exceptions=True)
+        if self.cache is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self.cache_thread, self.cache.close
+            )
+            self.cache_thread.shutdown()
+
+    async def handle(self, reader: asyncio.StreamReader, writer):
+        """Reads the requests of a connection and sends back their responses,
+        in the same order, while the next ones are being read and solved."""
+        responses = asyncio.Queue()
+        sender = asyncio.create_task(self.send(responses, writer))
+        self.senders.add(sender)
+        sender.add_done_callback(self.senders.discard)
+        number = 0
+        self.readers.add(asyncio.current_task())
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                number += 1
+                self.requests += 1
+                await self.slots.acquire()
+                response = asyncio.create_task(self.solve(request))
+                await responses.put((request.get("id", number), response))
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # closed by the client, or cancelled by close
+        finally:
+            self.readers.discard(asyncio.current_task())
+            await responses.put(None)
+            await sender
+
+    async def send(self, responses: asyncio.Queue, writer):
+        """Sends the responses of a connection in the order of the requests,
+        each one as soon as it and the ones before it are ready, then closes
+        the connection."""
+        try:
+            while True:
+                item = await responses.get()
+                if item is None:
+                    break
+                request_id, response = item
+                writer.write(
+                    (json.dumps({"id": request_id, **(await response)}) + "\n").encode()
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    """Runs the server until it gets SIGINT or SIGTERM."""
+    cache = SolutionCache(args.cache, args.cache_size) if args.cache else None
+    server = SolverServer(
+        args.jobs, args.queue_size, args.deadline, args.strategy, cache
+    )
+    await server.start()
+    if args.socket:
+        listener = await asyncio.start_unix_server(server.handle, args.socket)
+    else:
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", args.port)
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+    async with listener:
+        await stop.wait()
+        # Connections left open would keep the listener from closing
+        listener.close()
+        await server.close(args.shutdown_timeout)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Solves the Bimaru puzzles sent to it.")
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", metavar="PATH", help="Unix socket to listen on")
+    address.add_argument("--port", type=int, help="localhost TCP port to listen on")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="number of processes solving the puzzles (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        metavar="N",
+        help="requests queued or being solved at once (default: 64)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="default deadline of the requests (default: none)",
+    )
+    parser.add_argument(
+        "--strategy",
+        default="lazy",
+        help="default strategy of the requests, as search[:branching[:ordering]] "
+        "(default: lazy)",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        help="answer the puzzles (or rotations or reflections of them) solved "
+        "before from the solution cache in the SQLite database FILE",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        metavar="N",
+        help="keep up to N solutions in the --cache (default: 100000)",
+    )
+    parser.add_argument(
+        "--shutdown-timeout",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="time given to the requests being solved to finish when stopping, "
+        "before their processes are terminated (default: 5)",
+    )
+    args = parser.parse_args()
+    if args.shutdown_timeout < 0:
+        parser.error("--shutdown-timeout must be at least 0")
+    if args.jobs < 1 or args.queue_size < 1 or args.cache_size < 1:
+        parser.error("--jobs, --queue-size and --cache-size must be at least 1")
+    try:
+        parse_strategy(args.strategy)
+    except ValueError as error:
+        parser.error(str(error))
+    try:
+        asyncio.run(serve(args))
+    finally:
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
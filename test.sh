@@ -4,13 +4,14 @@
 # and run them, comparing them with their respective .out
 # if the output is the same, print "Test _ SUCCESS" in green,
 # otherwise print "Test _ FAILED" in red
+# any arguments are passed on to bimaru.py (e.g. ./test.sh --search backtracking)
 
 files=$(ls ./tests/ | grep ".txt")
 
 for file in $files
 do
   echo -e "Testing $file..."
-  python ./src/bimaru.py < ./tests/"$file" > /tmp/bimaru.out
+  python ./src/bimaru.py "$@" < ./tests/"$file" > /tmp/bimaru.out
   output=$(cat /tmp/bimaru.out)
   output_file=$(echo "$file" | sed 's/txt/out/')
   expected_output=$(cat ./tests/"$output_file")